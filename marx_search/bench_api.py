@@ -0,0 +1,175 @@
+"""Benchmark API latency under concurrent load.
+
+Run with ``python bench_api.py [--works N] [--passages N]``.  A synthetic
+corpus (see `bench_search.py`) is written to a temporary database, the API
+is started on it with uvicorn in a child process, and client threads then
+measure:
+
+1. cheap requests (``/works/``, ``/chapters/``) on their own;
+2. the same cheap requests while other clients keep fuzzy searches that
+   miss the search cache running.
+
+With searches scored on their own executor, the cheap requests' p99 should
+stay close to the first phase's.
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from sqlalchemy.orm import sessionmaker
+
+import models
+from bench_search import FUZZY_QUERIES, VOCABULARY, build_corpus
+from database import create_sqlite_engine
+
+CHEAP_PATHS = ["/works/", "/chapters/?work_id=1"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, MARX_DB_PATH=db_path)
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            get(http.client.HTTPConnection("127.0.0.1", port), "/works/")
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("the API did not start")
+
+
+def get(conn: http.client.HTTPConnection, path: str) -> float:
+    """Issue one request; return its latency in milliseconds."""
+    start = time.perf_counter()
+    conn.request("GET", path)
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{path}: HTTP {response.status}")
+    return (time.perf_counter() - start) * 1000
+
+
+def search_path(rng: random.Random) -> str:
+    # A misspelt phrase plus a random word: always a cache miss, always scored.
+    q = f"{rng.choice(FUZZY_QUERIES)} {rng.choice(VOCABULARY)}{rng.randint(0, 99)}"
+    return f"/search?q={quote(q)}&exact=false"
+
+
+def client(port: int, paths, stop: threading.Event, latencies: list) -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    while not stop.is_set():
+        latencies.append(get(conn, paths()))
+    conn.close()
+
+
+def run_phase(port: int, cheap: int, heavy: int, seconds: float, seed: int = 0):
+    """Return the cheap and search latencies of one timed phase."""
+    stop = threading.Event()
+    cheap_ms, search_ms = [], []
+    threads = []
+    for i in range(cheap):
+        rng = random.Random(seed + i)
+        threads.append(
+            threading.Thread(
+                target=client,
+                args=(port, lambda rng=rng: rng.choice(CHEAP_PATHS), stop, cheap_ms),
+            )
+        )
+    for i in range(heavy):
+        rng = random.Random(seed + 1000 + i)
+        threads.append(
+            threading.Thread(
+                target=client,
+                args=(port, lambda rng=rng: search_path(rng), stop, search_ms),
+            )
+        )
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return cheap_ms, search_ms
+
+
+def summary(latencies: list[float], seconds: float) -> str:
+    if not latencies:
+        return "-"
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return (
+        f"{len(ordered) / seconds:>8.0f}/s"
+        f"{statistics.median(ordered):>9.1f}{p99:>9.1f}{ordered[-1]:>9.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--works", type=int, default=5)
+    parser.add_argument("--passages", type=int, default=4000)
+    parser.add_argument("--cheap-clients", type=int, default=8)
+    parser.add_argument("--search-clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        engine = create_sqlite_engine(db_path)
+        models.Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as session:
+            build_corpus(session, args.works, args.passages)
+        engine.dispose()
+
+        port = free_port()
+        server = start_server(db_path, port)
+        try:
+            # Build the search indexes before timing anything.
+            get(http.client.HTTPConnection("127.0.0.1", port), "/search?q=warm+up")
+            print(f"{'phase':<26}{'endpoint':<10}{'rate':>10}"
+                  f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+            cheap_ms, _ = run_phase(port, args.cheap_clients, 0, args.seconds)
+            print(f"{'cheap only':<26}{'cheap':<10}{summary(cheap_ms, args.seconds)}")
+            cheap_ms, search_ms = run_phase(
+                port, args.cheap_clients, args.search_clients, args.seconds
+            )
+            label = f"with {args.search_clients} searching"
+            print(f"{label:<26}{'cheap':<10}{summary(cheap_ms, args.seconds)}")
+            print(f"{label:<26}{'search':<10}{summary(search_ms, args.seconds)}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Benchmark the scraper's parse and write paths on a synthetic work.
+
+Run with ``python bench_ingest.py [--passages N] [PAGE.htm ...]``.  The work
+is rendered as marxists.org-style HTML pages.
+
+The parse stage times the scraper's old BeautifulSoup/``html.parser``
+extraction against `scrape_marxists.stage_page` on lxml, and checks both yield the same
+chapter title, section titles and passage texts, on the synthetic pages and
+on any saved pages given on the command line.
+
+The work is then stored into fresh temporary SQLite databases: once the way
+the scraper used to write it (ORM objects and a flush after every passage)
+and once through `scrape_marxists.parse_page`, which writes each page with
+one bulk statement per table.  Both runs parse with lxml.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+import models
+import scrape_marxists
+from bench_search import PHRASES, synthetic_passage
+from fts import ensure_fts
+from term_linker import TermLinker, snippet_at
+
+
+def synthetic_pages(passages: int, per_chapter: int = 100, seed: int = 0):
+    """Return ``(url, html)`` pages holding `passages` paragraphs in total."""
+    rng = random.Random(seed)
+    pages = []
+    for chapter in range(1, passages // per_chapter + 1):
+        parts = [
+            "<html><head><title>Synthetic</title></head><body>",
+            '<div class="nav"><a href="index.htm">Contents</a> | '
+            '<a href="next.htm">Next</a></div>',
+            f"<h1>Chapter {chapter}</h1>",
+        ]
+        for n in range(per_chapter):
+            if n % 20 == 0:
+                parts.append(f"<h2>Section {n // 20 + 1}</h2>")
+            text = synthetic_passage(rng, rng.randint(20, 200))
+            parts.append(
+                f'<div class="text"><p class="fst"><span>{text}</span>'
+                f'<sup class="anote"><a name="n{n}" href="#f{n}">[{n}]</a></sup>'
+                "</p></div>"
+            )
+        parts.append('<table class="footer"><tr><td><a href="index.htm">'
+                     "Contents</a></td></tr></table></body></html>")
+        pages.append((f"https://example.org/work/ch{chapter:03d}.htm", "".join(parts)))
+    return pages
+
+
+def soup_rows(url: str, html: str) -> tuple:
+    """Title, section titles and passages the way the scraper used to read them."""
+    soup = BeautifulSoup(html, "html.parser")
+    header = soup.find(["h1", "h2", "h3"])
+    title = header.get_text(strip=True) if header else os.path.basename(url)
+    sections, passages = [], []
+    for element in soup.find_all(["h2", "h3", "p"]):
+        if element.name == "p":
+            text = element.get_text(" ", strip=True)
+            if text:
+                passages.append(text)
+        elif element != header:
+            sections.append(element.get_text(strip=True))
+    return title, sections, passages
+
+
+def lxml_rows(url: str, html: str) -> tuple:
+    """The same, through `scrape_marxists.stage_page` (lxml)."""
+    [(_, title, sections, passages)] = scrape_marxists.stage_page(url, html)
+    return title, sections, [text for _, text in passages]
+
+
+def bench_parse(pages) -> None:
+    """Time both parsers and check they agree on every page."""
+    print(f"{'parser':<22}{'seconds':>10}{'pages/s':>10}")
+    results = {}
+    for name, rows in (("bs4 html.parser", soup_rows), ("lxml", lxml_rows)):
+        start = time.perf_counter()
+        results[name] = [rows(url, html) for url, html in pages]
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22}{elapsed:>10.2f}{len(pages) / elapsed:>10.0f}")
+    mismatches = [
+        url
+        for (url, _), a, b in zip(pages, *results.values())
+        if a != b
+    ]
+    for url in mismatches:
+        print(f"⚠️  Parsers disagree on {url}")
+    print()
+
+
+def seed_work(session) -> models.Work:
+    work = models.Work(id=1, title="Synthetic", author="Bench")
+    session.add(work)
+    for phrase in PHRASES:
+        session.add(
+            models.Term(id=phrase.replace(" ", "-"), term=phrase, work_id=work.id)
+        )
+    session.commit()
+    return work
+
+
+def legacy_store(session, work, pages) -> None:
+    """The previous write path: ORM objects with a flush per passage."""
+    linker = TermLinker(session.query(models.Term))
+    chapter_id = (session.query(func.max(models.Chapter.id)).scalar() or 0) + 1
+    for url, html in pages:
+        for _, title, *content in scrape_marxists.stage_page(url, html):
+            session.add(
+                models.Chapter(
+                    id=chapter_id,
+                    chapter_number=chapter_id,
+                    title=title,
+                    work_id=work.id,
+                )
+            )
+            session.flush()
+            sections, passages = scrape_marxists.chapter_rows(
+                *content, chapter_id, chapter_id, work
+            )
+            for row in sections:
+                session.add(models.Section(**row))
+            for row in passages:
+                passage = models.Passage(**row)
+                session.add(passage)
+                session.flush()
+                for term_id, (start, end) in linker.find(row["text"]).items():
+                    session.add(
+                        models.TermPassageLink(
+                            term_id=term_id,
+                            passage_id=passage.id,
+                            text_snippet=snippet_at(row["text"], start, end),
+                            match_start=start,
+                            match_end=end,
+                            work_id=work.id,
+                        )
+                    )
+            chapter_id += 1
+    session.commit()
+
+
+def batched_store(session, work, pages) -> None:
+    """The current write path: `parse_page` with one batch per page."""
+    chapters = scrape_marxists.ChapterAllocator(session, work)
+    counts = dict.fromkeys(
+        ("chapters", "changed", "unchanged", "sections", "passages",
+         "updated", "deleted", "links"),
+        0,
+    )
+    for url, html in pages:
+        scrape_marxists.parse_page(session, url, chapters, work, counts, html)
+    session.commit()
+
+
+def count_rows(session) -> int:
+    return sum(
+        session.execute(select(func.count()).select_from(model)).scalar()
+        for model in (
+            models.Chapter,
+            models.Section,
+            models.Passage,
+            models.TermPassageLink,
+        )
+    )
+
+
+def run(store, pages, fts: bool) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        if fts:
+            ensure_fts(engine)
+        with sessionmaker(bind=engine)() as session:
+            work = seed_work(session)
+            start = time.perf_counter()
+            store(session, work, pages)
+            elapsed = time.perf_counter() - start
+            rows = count_rows(session)
+        engine.dispose()
+    return elapsed, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--passages", type=int, default=10_000)
+    parser.add_argument(
+        "--no-fts", action="store_true", help="skip the full-text index triggers"
+    )
+    parser.add_argument(
+        "saved", nargs="*", help="saved HTML pages to include in the parser check"
+    )
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.passages)
+    print(f"{len(pages)} pages, {args.passages} passages\n")
+    saved = []
+    for path in args.saved:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            saved.append((path, f.read()))
+    bench_parse(pages + saved)
+
+    print(f"{'write path':<22}{'rows':>8}{'seconds':>10}{'rows/s':>10}")
+    for name, store in (
+        ("per-row flush", legacy_store),
+        ("batched", batched_store),
+    ):
+        elapsed, rows = run(store, pages, fts=not args.no_fts)
+        print(f"{name:<22}{rows:>8}{elapsed:>10.2f}{rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
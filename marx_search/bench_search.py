@@ -0,0 +1,158 @@
+"""Benchmark passage search strategies on a synthetic multi-work corpus.
+
+Run with ``python bench_search.py [--works N] [--passages N]``.  The corpus
+is written to a temporary SQLite database, so the real `marx_texts.db` is
+never touched.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+import search_index
+
+VOCABULARY = (
+    "capital labour value surplus commodity money exchange use production "
+    "circulation wages profit rent interest price market worker capitalist "
+    "machine industry form social relation means product time rate "
+    "accumulation reproduction fixed circulating turnover credit bank land "
+    "the of and to in is a that as it by for which with this on be are its "
+    "not from or but at his has they their all one other so than"
+).split()
+
+PHRASES = [
+    "surplus-value",
+    "fixed capital",
+    "the rate of profit",
+    "means of production",
+    "circulation of commodities",
+]
+
+QUERIES = ["capital", "surplus-value", "the rate of profit", "bank", "wages"]
+
+FUZZY_QUERIES = [
+    "surplus valeu",
+    "rate of proffit",
+    "circulation of comodities",
+    "fixed capitol",
+    "means of prodution",
+    "wages",
+]
+
+
+def synthetic_passage(rng: random.Random, words: int) -> str:
+    # Zipf-like draw so common words dominate as in real prose.
+    tokens = [
+        VOCABULARY[min(int(rng.paretovariate(1.2)) - 1, len(VOCABULARY) - 1)]
+        if rng.random() < 0.6
+        else rng.choice(VOCABULARY)
+        for _ in range(words)
+    ]
+    for _ in range(rng.randint(0, 2)):
+        tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(PHRASES))
+    text = " ".join(tokens)
+    return text[0].upper() + text[1:] + "."
+
+
+def build_corpus(session, works: int, passages_per_work: int, seed: int = 0):
+    """Populate `session` with `works` works of synthetic passages."""
+    rng = random.Random(seed)
+    for work_id in range(1, works + 1):
+        session.add(models.Work(id=work_id, title=f"Work {work_id}"))
+        for n in range(1, passages_per_work + 1):
+            chapter = n // 50 + 1
+            session.add(
+                models.Passage(
+                    id=f"{work_id}.ch{chapter}.p{n}",
+                    chapter=chapter,
+                    section=None,
+                    paragraph=n,
+                    text=synthetic_passage(rng, rng.randint(20, 200)),
+                    translation="synthetic",
+                    work_id=work_id,
+                )
+            )
+    session.commit()
+
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def bench_exact(session, repeat: int) -> None:
+    start = time.perf_counter()
+    search_index.invalidate()
+    index = search_index.get_index(session)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"index build: {build_ms:.1f} ms ({len(index)} passages)")
+
+    print(f"{'query':<22}{'work':>6}{'hits':>8}{'scan ms':>10}{'index ms':>10}")
+    for q in QUERIES:
+        for work_id in (None, 2):
+            scan_ms, expected = timed(
+                lambda: search_index.scan_exact(session, q, work_id), repeat
+            )
+            index_ms, got = timed(
+                lambda: search_index.match_exact(session, q, work_id), repeat
+            )
+            assert got == expected, f"index mismatch for {q!r}"
+            print(
+                f"{q:<22}{work_id or '-':>6}{len(got):>8}"
+                f"{scan_ms:>10.2f}{index_ms:>10.2f}"
+            )
+
+
+def bench_fuzzy(session, repeat: int) -> None:
+    start = time.perf_counter()
+    index = search_index.get_trigram_index(session)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"\ntrigram index build: {build_ms:.1f} ms ({len(index)} passages)")
+
+    print(
+        f"{'query':<28}{'cands':>8}{'hits':>8}{'recall':>8}"
+        f"{'scan ms':>10}{'index ms':>10}"
+    )
+    for q in FUZZY_QUERIES:
+        scan_ms, expected = timed(
+            lambda: search_index.scan_fuzzy(session, q), repeat
+        )
+        index_ms, (got, total) = timed(
+            lambda: search_index.rank_fuzzy(session, q), repeat
+        )
+        assert total == len(got)
+        candidates = len(index.candidates(q.lower()))
+        recall = len(set(got) & set(expected)) / len(expected) if expected else 1
+        print(
+            f"{q:<28}{candidates:>8}{len(got):>8}{recall:>8.3f}"
+            f"{scan_ms:>10.2f}{index_ms:>10.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--works", type=int, default=5)
+    parser.add_argument("--passages", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as session:
+            build_corpus(session, args.works, args.passages)
+            bench_exact(session, args.repeat)
+            bench_fuzzy(session, args.repeat)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Fail if an API endpoint's SQL falls back to a full table scan.
+
+Run with ``python check_query_plans.py [--db PATH]``.  Every endpoint is
+called against a small corpus in a temporary database built by
+`migrate.migrate`, or against an existing database (left unchanged) with
+``--db``.  The statements they issue are captured and run again under
+``EXPLAIN QUERY PLAN``; a ``SCAN`` of a table in a statement that filters
+or joins means an index is missing.  The only scans allowed are the
+unfiltered single-table reads in `WHOLE_TABLE_READS`.  Exits non-zero on
+failure.
+
+Importing `database` fixes the API's database path and importing `main`
+migrates it, so both are imported only once ``MARX_DB_PATH`` points at a
+scratch file; the real ``marx_texts.db`` is never opened.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+from fastapi import HTTPException
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import sessionmaker
+
+import models
+from fts import FTS_TABLE, ensure_fts
+from migrate import migrate
+import toc
+
+# Tables some endpoint reads in full, on purpose, and why.
+WHOLE_TABLE_READS = {
+    "works": "GET /works lists every work",
+    "tocs": "GET /chapters-with-sections without a work lists every work's TOC",
+    "terms": "the term matcher loads every term",
+    "passages": "the in-memory search index loads every passage",
+}
+
+
+def seed(session) -> None:
+    """Two works with chapters, sections, passages, terms and links."""
+    for work_id in (1, 2):
+        session.add(models.Work(id=work_id, title=f"Work {work_id}"))
+        session.add(
+            models.Term(
+                id=f"value-{work_id}",
+                term="value",
+                definition="",
+                tags="",
+                work_id=work_id,
+            )
+        )
+        for number in (1, 2, 3):
+            chapter_id = work_id * 10 + number
+            session.add(
+                models.Chapter(
+                    id=chapter_id,
+                    chapter_number=number,
+                    title=f"Chapter {number}",
+                    work_id=work_id,
+                )
+            )
+            session.add(
+                models.Section(
+                    id=f"{work_id}.ch{chapter_id}.sec1",
+                    chapter=chapter_id,
+                    section=1,
+                    title="Section 1",
+                    work_id=work_id,
+                )
+            )
+            for paragraph in (1, 2):
+                passage_id = f"{work_id}.ch{chapter_id}.p{paragraph}"
+                session.add(
+                    models.Passage(
+                        id=passage_id,
+                        chapter=number,
+                        section=1,
+                        paragraph=paragraph,
+                        text="The value of labour power and surplus value.",
+                        translation="",
+                        work_id=work_id,
+                    )
+                )
+                session.add(
+                    models.TermPassageLink(
+                        term_id=f"value-{work_id}",
+                        passage_id=passage_id,
+                        text_snippet="value",
+                        work_id=work_id,
+                    )
+                )
+    session.add(
+        models.Part(
+            number=1, title="Part I", start_chapter=11, end_chapter=13, work_id=1
+        )
+    )
+    toc.rebuild_all(session, 1)
+    session.commit()
+
+
+async def call_endpoints(
+    adb, work_id: int, chapter_number: int, term_id: str, fts: bool
+) -> None:
+    import main
+
+    calls = [
+        lambda: main.list_works(adb),
+        lambda: main.get_work(work_id, adb),
+        lambda: main.list_terms(work_id, adb),
+        lambda: main.get_term(term_id, adb),
+        lambda: main.count_term_links(term_id, work_id, adb),
+        lambda: main.get_chapters(work_id, adb),
+        lambda: main.get_parts_with_chapters_sections(work_id, adb, None),
+        lambda: main.get_chapters_with_sections(work_id, adb, None),
+        lambda: main.get_chapters_with_sections(None, adb, None),
+    ]
+    for scope in (work_id, None):
+        calls.append(
+            lambda scope=scope: main.get_term_links(term_id, scope, adb, 1, 10)
+        )
+    for terms in ("all", "work", "chapter"):
+        calls.append(
+            lambda terms=terms: main.get_chapter_data(
+                work_id, chapter_number, terms, adb
+            )
+        )
+    backends = ["memory"] + (["fts"] if fts else [])
+    for backend in backends:
+        for exact in (True, False):
+            calls.append(
+                lambda backend=backend, exact=exact: main.search(
+                    "surplus value", exact, 1, 10, work_id, backend, adb
+                )
+            )
+    for call in calls:
+        try:
+            result = call()
+            if asyncio.iscoroutine(result):
+                await result
+        except HTTPException:
+            pass
+
+
+async def capture_statements(
+    path: str, engine, work_id: int, chapter_number: int, term_id: str
+) -> list:
+    """Run the endpoints against `path`; return the SELECTs they issued.
+
+    The search executor reads through the API's own sessions, so those are
+    pointed at `path` too, and back at their old engines afterwards.
+    """
+    import database
+    from database import create_async_sqlite_engine, create_sqlite_engine
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+
+    fts = inspect(engine).has_table(FTS_TABLE)
+    previous = database.engine, database.async_engine
+    reader = create_sqlite_engine(path, read_only=True)
+    async_reader = create_async_sqlite_engine(path, read_only=True)
+    await database.use_reader(reader, async_reader)
+    for target in (reader, async_reader.sync_engine):
+        event.listen(target, "before_cursor_execute", capture)
+    try:
+        async with database.AsyncSessionLocal() as adb:
+            await call_endpoints(adb, work_id, chapter_number, term_id, fts)
+    finally:
+        await database.use_reader(*previous)
+    return statements
+
+
+def whole_table_read(query: str, detail: str) -> bool:
+    """Whether `detail` scans a `WHOLE_TABLE_READS` table that `query` reads
+    in full: no ``WHERE`` and no ``JOIN``."""
+    words = query.upper().split()
+    table = detail.split()[1]
+    filtered = "WHERE" in words or "JOIN" in words
+    return table in WHOLE_TABLE_READS and not filtered
+
+
+def check(
+    path: str, engine, work_id: int, chapter_number: int, term_id: str
+) -> list[str]:
+    """Return the plan lines that scan a table where an index should be used."""
+    statements = asyncio.run(
+        capture_statements(path, engine, work_id, chapter_number, term_id)
+    )
+
+    failures = []
+    seen = set()
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            plan = conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + statement, parameters
+            ).all()
+            scans = [
+                row.detail
+                for row in plan
+                if row.detail.startswith("SCAN ")
+                and "VIRTUAL TABLE" not in row.detail
+            ]
+            query = " ".join(statement.split())
+            for detail in scans:
+                if not whole_table_read(query, detail):
+                    failures.append(f"{detail}\n    in: {query[:200]}")
+    return failures
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", help="check this database instead of a seeded one")
+    parser.add_argument("--work-id", type=int, default=1)
+    parser.add_argument("--chapter", type=int, default=1)
+    parser.add_argument("--term-id", default="value-1")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["MARX_DB_PATH"] = os.path.join(tmp, "api.db")
+        from database import create_sqlite_engine
+
+        path = args.db or os.path.join(tmp, "plans.db")
+        engine = create_sqlite_engine(path, read_only=bool(args.db))
+        if not args.db:
+            migrate(engine)
+            ensure_fts(engine)
+            with sessionmaker(bind=engine)() as session:
+                seed(session)
+        failures = check(path, engine, args.work_id, args.chapter, args.term_id)
+        engine.dispose()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ No endpoint query scans a table it filters.")
+
+
+if __name__ == "__main__":
+    main_cli()
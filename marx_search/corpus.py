@@ -0,0 +1,62 @@
+"""Corpus version and id-sequence bookkeeping.
+
+Every tool that writes passages, terms or links calls `bump_version` in the
+same transaction as its writes.  The API compares the stored version with
+the one its in-memory indexes and caches were built for and drops anything
+older.
+
+Chapter ids come from a sequence stored next to the version (see
+`reserve_ids`) rather than from ``max(id) + 1``, so concurrent ingests can
+never hand out the same id twice.
+"""
+
+from sqlalchemy import Integer, cast, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import Meta
+
+VERSION_KEY = "corpus_version"
+CHAPTER_ID_KEY = "next_chapter_id"
+
+
+def get_version(session: Session) -> int:
+    """Return the current corpus version (0 for a fresh database)."""
+    value = (
+        session.query(Meta.value).filter(Meta.key == VERSION_KEY).scalar()
+    )
+    return int(value) if value is not None else 0
+
+
+def bump_version(session: Session) -> int:
+    """Increment the corpus version; the caller commits."""
+    Meta.__table__.create(bind=session.connection(), checkfirst=True)
+    row = session.get(Meta, VERSION_KEY)
+    if row is None:
+        row = Meta(key=VERSION_KEY, value="0")
+        session.add(row)
+    row.value = str(int(row.value) + 1)
+    return int(row.value)
+
+
+def reserve_ids(session: Session, key: str, count: int = 1, floor: int = 1) -> int:
+    """Reserve `count` consecutive ids from sequence `key`; return the first.
+
+    The sequence never goes below `floor` (e.g. one past the largest id
+    already stored).  The update takes SQLite's write lock, so concurrent
+    reservations get disjoint ranges.  The caller commits.
+    """
+    Meta.__table__.create(bind=session.connection(), checkfirst=True)
+    session.execute(
+        insert(Meta)
+        .values(key=key, value=str(floor))
+        .on_conflict_do_nothing(index_elements=["key"])
+    )
+    session.execute(
+        update(Meta)
+        .where(Meta.key == key)
+        .values(value=func.max(cast(Meta.value, Integer), floor) + count)
+        .execution_options(synchronize_session=False)
+    )
+    stored = session.execute(select(Meta.value).where(Meta.key == key)).scalar()
+    return int(stored) - count
@@ -1,8 +1,187 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+"""SQLite engines shared by the API and the import tools.
+
+Everything opens the same file, `DB_PATH` (next to this module unless
+``MARX_DB_PATH`` is set), through `create_sqlite_engine`.  Connection
+pragmas come from a profile, picked with ``MARX_DB_PROFILE``:
+
+* ``production`` (default) – WAL journaling, so readers keep reading while
+  a tool commits, ``synchronous=NORMAL`` (durable at checkpoints, never
+  corrupt), a 64 MiB page cache, 256 MiB of memory-mapped I/O and a
+  busy timeout instead of immediate "database is locked" errors.
+* ``compat`` – SQLite's own rollback journal and full syncs, plus the busy
+  timeout, for filesystems where WAL does not work (e.g. network shares).
+* ``staging`` – unsynced and unjournaled on disk, for the private copies
+  `publish.py` builds.
+
+The API reads through `async_engine`/`AsyncSessionLocal` (aiosqlite) from
+its async endpoints and through `engine`/`SessionLocal` from the rest and
+from the search executor: pools of connections with ``query_only`` set.
+Tools that write use `writer_engine`/`WriterSession`, a single connection
+of their own.
+
+When databases are published blue/green (see `publish.py`) each build is a
+separate file and ``<DB_PATH>.current`` names the live one; everything here
+opens that file.  `use_reader` moves the API's sessions to a newly
+published file.
+"""
+
 import os
 
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'marx_texts.db')}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+DB_PATH = os.environ.get("MARX_DB_PATH", os.path.join(BASE_DIR, "marx_texts.db"))
+DB_PROFILE = os.environ.get("MARX_DB_PROFILE", "production")
+POINTER_PATH = DB_PATH + ".current"
+
+PROFILES = {
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64 * 1024,  # KiB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,  # ms
+    },
+    "compat": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    # Staging copies being built for publishing: nothing reads them yet and
+    # a crash only loses the copy.
+    "staging": {
+        "journal_mode": "MEMORY",
+        "synchronous": "OFF",
+        "cache_size": -256 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+
+def current_db_path() -> str:
+    """The published database file, or `DB_PATH` if nothing was published."""
+    try:
+        with open(POINTER_PATH, encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return DB_PATH
+    return os.path.join(os.path.dirname(DB_PATH), name)
+
+
+def published_stamp() -> tuple | None:
+    """Changes whenever a database is published (cheap enough per request)."""
+    try:
+        stat = os.stat(POINTER_PATH)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _set_pragmas(engine, profile: str, read_only: bool) -> None:
+    pragmas = dict(PROFILES[profile])
+    if read_only:
+        pragmas.pop("journal_mode", None)
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def file_stamp(path: str) -> tuple:
+    """Changes whenever the database at `path` (or its WAL) is written.
+
+    Lets the API skip re-reading the corpus version while nothing changed.
+    """
+    stamp = []
+    for name in (path, path + "-wal"):
+        try:
+            stat = os.stat(name)
+        except FileNotFoundError:
+            stamp.append(None)
+        else:
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+
+def create_sqlite_engine(
+    path: str | None = None,
+    profile: str = DB_PROFILE,
+    read_only: bool = False,
+    **kwargs,
+):
+    """Return an engine for the SQLite file at `path` with `profile`'s pragmas.
+
+    `path` defaults to the current database (see `current_db_path`).
+    `read_only` connections refuse writes (``PRAGMA query_only``) and leave
+    the journal mode to the writers, since changing it needs a write.
+    Extra keyword arguments go to `create_engine`.
+    """
+    engine = create_engine(
+        f"sqlite:///{path or current_db_path()}",
+        connect_args={"check_same_thread": False},
+        **kwargs,
+    )
+    _set_pragmas(engine, profile, read_only)
+    return engine
+
+
+def create_async_sqlite_engine(
+    path: str | None = None,
+    profile: str = DB_PROFILE,
+    read_only: bool = False,
+    **kwargs,
+):
+    """Like `create_sqlite_engine`, for asyncio code (through aiosqlite)."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path or current_db_path()}", **kwargs
+    )
+    _set_pragmas(engine.sync_engine, profile, read_only)
+    return engine
+
+
+def open_reader(path: str | None = None):
+    """A pool of read-only connections for the API."""
+    return create_sqlite_engine(path, read_only=True, pool_size=8, max_overflow=8)
+
+
+def open_async_reader(path: str | None = None):
+    """A pool of read-only aiosqlite connections for the API's async endpoints."""
+    return create_async_sqlite_engine(
+        path, read_only=True, pool_size=8, max_overflow=8
+    )
+
+
+engine = open_reader()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = open_async_reader()
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+async def use_reader(new_engine, new_async_engine) -> None:
+    """Point the API's sessions at new engines and retire the old pools.
+
+    Sessions already open finish on the old file; their connections are
+    closed as they are returned.
+    """
+    global engine, async_engine
+    old, engine = engine, new_engine
+    old_async, async_engine = async_engine, new_async_engine
+    SessionLocal.configure(bind=new_engine)
+    AsyncSessionLocal.configure(bind=new_async_engine)
+    old.dispose()
+    await old_async.dispose()
+
+
+writer_engine = create_sqlite_engine(pool_size=1, max_overflow=0)
+WriterSession = sessionmaker(bind=writer_engine)
@@ -0,0 +1,353 @@
+"""Near-duplicate passage detection with MinHash and LSH.
+
+Overlapping anchor links, prefaces repeated across editions and a
+translation imported both from marxists.org and from a .docx all store the
+same text more than once.  Every passage gets a MinHash signature of its
+word 3-gram shingles, kept in `passages.minhash` (empty for passages too
+short to compare).  The signature is cut into bands and passages sharing
+any band land in the same bucket; only those are compared, so checking a
+passage costs the same however large the corpus is.
+Two passages are near-duplicates when the share of equal signature values
+(an estimate of the Jaccard similarity of their shingle sets) reaches the
+threshold.
+
+Run ``python dedup.py`` to list the near-duplicates already stored, per
+work.
+"""
+
+import argparse
+import zlib
+from collections import defaultdict
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import Passage, Work
+from search_index import tokenize
+
+NUM_PERM = 128
+SHINGLE_WORDS = 3
+# Shorter passages ("Ibid.", "* * *") repeat legitimately and are never flagged.
+MIN_SHINGLES = 8
+DEFAULT_THRESHOLD = 0.85
+
+_MERSENNE_61 = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)[:, None]
+
+
+def signature(text: str) -> np.ndarray | None:
+    """MinHash signature of `text`, or None if it is too short to compare."""
+    tokens = tokenize(text or "")
+    shingles = {
+        " ".join(tokens[i : i + SHINGLE_WORDS])
+        for i in range(len(tokens) - SHINGLE_WORDS + 1)
+    }
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # Unsigned arithmetic wraps, which is fine for a hash family.
+    with np.errstate(over="ignore"):
+        values = (_A * hashes + _B) % _MERSENNE_61 & _MAX_HASH
+    return values.min(axis=1).astype(np.uint32)
+
+
+def to_blob(sig: np.ndarray | None) -> bytes:
+    """Stored form of a signature; too-short passages store ``b""``."""
+    return b"" if sig is None else sig.tobytes()
+
+
+def from_blob(blob: bytes | None) -> np.ndarray | None:
+    return np.frombuffer(blob, dtype=np.uint32) if blob else None
+
+
+def lsh_bands(threshold: float, num_perm: int = NUM_PERM) -> tuple[int, int]:
+    """Return ``(bands, rows)`` whose S-curve turns just below `threshold`.
+
+    A pair with similarity ``s`` shares a bucket with probability
+    ``1 - (1 - s**rows) ** bands``, which rises steeply around
+    ``(1 / bands) ** (1 / rows)``.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class Duplicate(NamedTuple):
+    passage_id: str
+    work_id: int
+    duplicate_of: str
+    similarity: float
+
+
+class DuplicateIndex:
+    """LSH buckets over passage signatures.
+
+    `check` compares a passage with everything added so far; with `skip`
+    set, `filter_rows` drops near-duplicates instead of only reporting them.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, skip: bool = True):
+        self.threshold = threshold
+        self.skip = skip
+        self.bands, self.rows = lsh_bands(threshold)
+        self.buckets = [defaultdict(list) for _ in range(self.bands)]
+        self.signatures: dict[str, np.ndarray] = {}
+        # Ids in `signatures` by work and by chapter prefix, for `discard`.
+        self.groups: dict[str, set[str]] = defaultdict(set)
+        self.report: list[Duplicate] = []
+        # Signatures replaced since `begin`, by passage id (None: absent).
+        self._undo: dict[str, np.ndarray | None] | None = None
+
+    @classmethod
+    def load(
+        cls, session: Session, threshold: float = DEFAULT_THRESHOLD, skip: bool = True
+    ) -> "DuplicateIndex":
+        """Index the signatures of every stored passage.
+
+        Only passages stored without one (see `backfill`) have their text
+        read, to be signed on the fly.  Build the index once per run and
+        reuse it: `check` keeps it up to date as passages are stored.
+        """
+        index = cls(threshold, skip)
+        rows = session.query(Passage.id, Passage.minhash).filter(
+            Passage.minhash.is_not(None)
+        )
+        for passage_id, blob in rows.yield_per(5000):
+            sig = from_blob(blob)
+            if sig is not None:
+                index.add(passage_id, sig)
+        unsigned = session.query(Passage.id, Passage.text).filter(
+            Passage.minhash.is_(None)
+        )
+        for passage_id, text in unsigned.yield_per(5000):
+            sig = signature(text)
+            if sig is not None:
+                index.add(passage_id, sig)
+        return index
+
+    def begin(self) -> None:
+        """Start recording changes, so `rollback` can undo them, and clear
+        the report; call when storing a work starts."""
+        self._undo = {}
+        self.report = []
+
+    def commit(self) -> None:
+        """Keep the changes made since `begin`."""
+        self._undo = None
+
+    def rollback(self) -> None:
+        """Undo the changes made since `begin`, with the transaction they
+        belonged to."""
+        for passage_id, sig in (self._undo or {}).items():
+            if sig is None:
+                self._unset(passage_id)
+            else:
+                # Its bucket entries were never removed.
+                self._set(passage_id, sig)
+        self._undo = None
+
+    def _remember(self, passage_id: str) -> None:
+        if self._undo is not None and passage_id not in self._undo:
+            self._undo[passage_id] = self.signatures.get(passage_id)
+
+    @staticmethod
+    def _prefixes(passage_id: str):
+        """The work (``"1.ch"``) and chapter (``"1.ch5.p"``) prefixes of an id."""
+        head, sep, _ = passage_id.partition(".ch")
+        if sep:
+            yield head + sep
+        head, sep, _ = passage_id.rpartition(".p")
+        if sep:
+            yield head + sep
+
+    def _set(self, passage_id: str, sig: np.ndarray) -> None:
+        self.signatures[passage_id] = sig
+        for prefix in self._prefixes(passage_id):
+            self.groups[prefix].add(passage_id)
+
+    def _unset(self, passage_id: str) -> np.ndarray | None:
+        for prefix in self._prefixes(passage_id):
+            group = self.groups.get(prefix)
+            if group is not None:
+                group.discard(passage_id)
+                if not group:
+                    del self.groups[prefix]
+        return self.signatures.pop(passage_id, None)
+
+    def _keys(self, sig: np.ndarray):
+        data = sig.tobytes()
+        width = self.rows * sig.itemsize
+        for band in range(self.bands):
+            yield data[band * width : (band + 1) * width]
+
+    def add(self, passage_id: str, sig: np.ndarray) -> None:
+        self._remember(passage_id)
+        self._set(passage_id, sig)
+        for bucket, key in zip(self.buckets, self._keys(sig)):
+            bucket[key].append(passage_id)
+
+    def discard(self, prefix: str) -> dict[str, np.ndarray]:
+        """Forget the passages whose ids start with `prefix`; return their signatures.
+
+        `prefix` is a work's (``"1.ch"``) or a chapter's (``"1.ch5.p"``), as
+        used before re-importing one, whose stored passages are about to be
+        replaced rather than duplicated.  It is looked up in `groups`, so
+        this costs the size of that work or chapter only.
+        """
+        discarded = {}
+        for passage_id in list(self.groups.get(prefix, ())):
+            self._remember(passage_id)
+            discarded[passage_id] = self._unset(passage_id)
+        return discarded
+
+    def match(self, passage_id: str, sig: np.ndarray) -> tuple[str, float] | None:
+        """Most similar indexed passage other than `passage_id` above the threshold."""
+        best = None
+        seen = {passage_id}
+        for bucket, key in zip(self.buckets, self._keys(sig)):
+            for other in bucket.get(key, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                # Buckets keep entries of discarded and re-signed passages;
+                # only the current signature counts.
+                current = self.signatures.get(other)
+                if current is None:
+                    continue
+                similarity = float(np.mean(current == sig))
+                if similarity >= self.threshold and (
+                    best is None or similarity > best[1]
+                ):
+                    best = (other, similarity)
+        return best
+
+    def check(self, passage_id: str, work_id: int, text: str):
+        """Sign a passage and compare it with the index.
+
+        Returns ``(signature, duplicate)``; `duplicate` is a `Duplicate` (also
+        appended to `report`) or None, in which case the passage is indexed.
+        """
+        sig = signature(text)
+        if sig is None:
+            self._remember(passage_id)
+            self._unset(passage_id)
+            return None, None
+        found = self.match(passage_id, sig)
+        if found is None:
+            self.add(passage_id, sig)
+            return sig, None
+        duplicate = Duplicate(passage_id, work_id, *found)
+        self.report.append(duplicate)
+        return sig, duplicate
+
+    def filter_rows(self, rows: list[dict]) -> list[dict]:
+        """Fill in ``minhash`` on passage rows and drop skipped duplicates."""
+        kept = []
+        for row in rows:
+            sig, duplicate = self.check(row["id"], row["work_id"], row["text"])
+            row["minhash"] = to_blob(sig)
+            if duplicate is None or not self.skip:
+                kept.append(row)
+        return kept
+
+
+def print_report(report: list[Duplicate], title: str, action: str, limit: int = 20):
+    """Print the near-duplicates found in one work."""
+    if not report:
+        return
+    print(f"🔁 {len(report)} near-duplicate passages in '{title}' ({action}):")
+    for dup in report[:limit]:
+        print(f"   {dup.passage_id} ≈ {dup.duplicate_of} ({dup.similarity:.2f})")
+    if len(report) > limit:
+        print(f"   … and {len(report) - limit} more")
+
+
+def backfill(session: Session, chunk: int = 5000) -> int:
+    """Store signatures for passages that have none; the caller commits."""
+    filled = 0
+    while True:
+        rows = (
+            session.query(Passage.id, Passage.text)
+            .filter(Passage.minhash.is_(None))
+            .limit(chunk)
+            .all()
+        )
+        if not rows:
+            return filled
+        session.execute(
+            update(Passage),
+            [
+                {"id": passage_id, "minhash": to_blob(signature(text))}
+                for passage_id, text in rows
+            ],
+        )
+        filled += len(rows)
+
+
+def find_duplicates(session: Session, threshold: float = DEFAULT_THRESHOLD):
+    """Return the near-duplicates among stored passages, grouped by work.
+
+    Passages are visited work by work in id order, so the earliest copy is
+    kept as the original.
+    """
+    index = DuplicateIndex(threshold, skip=False)
+    rows = (
+        session.query(Passage.id, Passage.work_id, Passage.minhash, Passage.text)
+        .order_by(Passage.work_id, Passage.chapter, Passage.paragraph, Passage.id)
+        .yield_per(5000)
+    )
+    for passage_id, work_id, blob, text in rows:
+        sig = from_blob(blob) if blob is not None else signature(text)
+        if sig is None:
+            continue
+        found = index.match(passage_id, sig)
+        if found is None:
+            index.add(passage_id, sig)
+        else:
+            index.report.append(Duplicate(passage_id, work_id, *found))
+    by_work = defaultdict(list)
+    for dup in index.report:
+        by_work[dup.work_id].append(dup)
+    return by_work
+
+
+if __name__ == "__main__":
+    from database import WriterSession, writer_engine
+    from migrate import migrate
+
+    parser = argparse.ArgumentParser(
+        description="List near-duplicate passages stored in marx_texts.db."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"estimated Jaccard similarity to report (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument("--limit", type=int, default=20, help="pairs shown per work")
+    args = parser.parse_args()
+
+    migrate(writer_engine)
+    with WriterSession() as session:
+        filled = backfill(session)
+        session.commit()
+        if filled:
+            print(f"✍️  Signed {filled} passages.")
+        by_work = find_duplicates(session, args.threshold)
+        titles = dict(session.query(Work.id, Work.title))
+        for work_id, report in sorted(by_work.items()):
+            print_report(report, titles.get(work_id, work_id), "stored", args.limit)
+        if not by_work:
+            print("✅ No near-duplicate passages.")
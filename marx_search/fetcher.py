@@ -0,0 +1,158 @@
+"""Pooled, concurrent HTTP fetching for the scraper.
+
+A single `requests.Session` keeps connections alive across pages, a thread
+pool downloads several pages at once, a per-host limiter spaces requests out
+so marxists.org is not hammered, and transient failures are retried with
+exponential backoff.  `get_many` yields results in input order, so callers
+can keep parsing and writing chapters deterministically.
+
+With an `HTTPCache`, bodies are kept on disk together with their
+``ETag``/``Last-Modified`` validators and revalidated with conditional
+requests, so unchanged pages cost a ``304``.  In offline mode pages are only
+replayed from the cache.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+from urllib.parse import urldefrag, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class RateLimiter:
+    """Allow at most `rate` requests per second to each host."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class OfflineCacheMiss(LookupError):
+    """Raised in offline mode for a URL that is not cached."""
+
+
+class HTTPCache:
+    """On-disk store of response bodies and their validators, keyed by URL."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self, url: str) -> dict | None:
+        """Return ``{"url", "body", "etag", "last_modified"}`` or None."""
+        try:
+            with open(self._path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url: str, resp: requests.Response) -> None:
+        entry = {
+            "url": url,
+            "body": resp.text,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename so concurrent readers never see half a file.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._path(url))
+
+
+class Fetcher:
+    """Download pages over a shared connection pool."""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        rate: float = 4.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30.0,
+        cache: HTTPCache | None = None,
+        offline: bool = False,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache
+        self.offline = offline
+        self.limiter = RateLimiter(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers,
+            pool_maxsize=max_workers,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str) -> str:
+        """Return the body of `url` (fragments are ignored)."""
+        url, _ = urldefrag(url)
+        cached = self.cache.load(url) if self.cache else None
+        if self.offline:
+            if cached is None:
+                raise OfflineCacheMiss(url)
+            return cached["body"]
+
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        self.limiter.wait(urlparse(url).netloc)
+        resp = self.session.get(url, headers=headers, timeout=self.timeout)
+        if cached and resp.status_code == 304:
+            return cached["body"]
+        resp.raise_for_status()
+        if self.cache:
+            self.cache.store(url, resp)
+        return resp.text
+
+    def _try_get(self, url: str) -> str | Exception:
+        try:
+            return self.get(url)
+        except Exception as e:
+            return e
+
+    def get_many(
+        self, urls: Iterable[str]
+    ) -> Iterator[tuple[str, str | Exception]]:
+        """Fetch `urls` concurrently, yielding ``(url, body or error)`` in order."""
+        urls = list(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            yield from zip(urls, pool.map(self._try_get, urls))
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,163 @@
+"""SQLite FTS5 mirror of `passages.text` with bm25-ranked search.
+
+`passages_fts` is an external-content FTS5 table: it stores only the
+full-text index and reads passage columns back from `passages` by rowid.
+Triggers keep it in sync with inserts, updates and deletes.  Run
+``python fts.py`` to rebuild it from scratch, e.g. after a ``VACUUM`` (which
+may renumber the implicit rowids of `passages`).
+"""
+
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+FTS_TABLE = "passages_fts"
+
+WORD_CHAR_RE = re.compile(r"\w")
+
+CREATE_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text,
+        work_id UNINDEXED,
+        chapter UNINDEXED,
+        section UNINDEXED,
+        content='passages',
+        content_rowid='rowid'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS passages_fts_ai AFTER INSERT ON passages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text, work_id, chapter, section)
+        VALUES (new.rowid, new.text, new.work_id, new.chapter, new.section);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS passages_fts_ad AFTER DELETE ON passages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, work_id, chapter, section)
+        VALUES ('delete', old.rowid, old.text, old.work_id, old.chapter, old.section);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS passages_fts_au AFTER UPDATE ON passages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, work_id, chapter, section)
+        VALUES ('delete', old.rowid, old.text, old.work_id, old.chapter, old.section);
+        INSERT INTO {FTS_TABLE}(rowid, text, work_id, chapter, section)
+        VALUES (new.rowid, new.text, new.work_id, new.chapter, new.section);
+    END
+    """,
+]
+
+
+def ensure_fts(engine) -> bool:
+    """Create the FTS table and triggers if missing.
+
+    A freshly created table is populated from `passages`.  Returns False when
+    the SQLite build has no FTS5 support.
+    """
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                {"name": FTS_TABLE},
+            ).first()
+            for statement in CREATE_STATEMENTS:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(
+                    text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+                )
+    except OperationalError as e:
+        print(f"⚠️  Full-text search unavailable: {e}")
+        return False
+    return True
+
+
+def rebuild_fts(engine) -> None:
+    """Re-index every passage."""
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def to_match_query(q: str, exact: bool) -> str:
+    """Translate a user query into an FTS5 MATCH expression.
+
+    Exact queries become a single phrase; otherwise every word must occur,
+    each as a prefix.
+    """
+    words = q.split()
+    if exact:
+        return '"' + " ".join(words).replace('"', '""') + '"'
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+def phrase_candidates(session: Session, phrases: list[str]):
+    """Return ``(id, work_id, text)`` of passages containing any of `phrases`.
+
+    FTS tokenisation is looser than whole-word regex matching, so the result
+    is a superset that callers still verify.  Returns None when a phrase has
+    no indexable words or the FTS table is missing.
+    """
+    if not phrases or any(not WORD_CHAR_RE.search(p) for p in phrases):
+        return None
+    match = " OR ".join(to_match_query(p, exact=True) for p in phrases)
+    try:
+        return session.execute(
+            text(
+                f"""
+                SELECT passages.id, passages.work_id, passages.text
+                FROM {FTS_TABLE}
+                JOIN passages ON passages.rowid = {FTS_TABLE}.rowid
+                WHERE {FTS_TABLE} MATCH :match
+                """
+            ),
+            {"match": match},
+        ).all()
+    except OperationalError:
+        return None
+
+
+def search_fts(
+    db: Session,
+    q: str,
+    exact: bool,
+    work_id: int | None = None,
+    limit: int = 10,
+    offset: int = 0,
+) -> tuple[list[str], int]:
+    """Return one page of passage ids ordered by bm25 and the total hit count."""
+    if not q.split():
+        return [], 0
+    where = f"{FTS_TABLE} MATCH :match"
+    params = {"match": to_match_query(q, exact)}
+    if work_id is not None:
+        where += f" AND {FTS_TABLE}.work_id = :work_id"
+        params["work_id"] = work_id
+
+    total = db.execute(
+        text(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {where}"), params
+    ).scalar()
+    rows = db.execute(
+        text(
+            f"""
+            SELECT passages.id
+            FROM {FTS_TABLE}
+            JOIN passages ON passages.rowid = {FTS_TABLE}.rowid
+            WHERE {where}
+            ORDER BY bm25({FTS_TABLE})
+            LIMIT :limit OFFSET :offset
+            """
+        ),
+        {**params, "limit": limit, "offset": offset},
+    )
+    return [row.id for row in rows], total
+
+
+if __name__ == "__main__":
+    from database import writer_engine
+
+    ensure_fts(writer_engine)
+    rebuild_fts(writer_engine)
+    print("✅ Rebuilt full-text index.")
@@ -0,0 +1,80 @@
+"""lxml helpers for reading marxists.org pages.
+
+Pages are parsed by libxml2 straight into an `lxml.html` tree and the
+scraper walks only the elements it consumes (``a``, ``h1``–``h3``, ``p``).
+The text helpers reproduce what BeautifulSoup's ``get_text(strip=True)``
+returned under ``html.parser``, which the scraper used before, so stored
+passages do not change: strings are split at comments and child tags,
+script/style contents are skipped, and numeric references into the
+Windows-1252 range (``&#151;``) decode to the characters browsers show.
+"""
+
+import re
+
+import lxml.html
+
+PARSER = lxml.html.HTMLParser(encoding="utf-8")
+SKIP_TAGS = {"script", "style", "template"}
+# Only whole references: "&#1488;" must not be read as "&#148" + "8;".
+C1_REF_RE = re.compile(
+    r"&#(?:[xX]0*([89][0-9a-fA-F])(?![0-9a-fA-F])|0*(1[2-5][0-9])(?![0-9]))(;?)"
+)
+
+
+def _cp1252_ref(m: re.Match) -> str:
+    code = int(m.group(1), 16) if m.group(1) else int(m.group(2))
+    if code > 159:
+        return m.group(0)
+    try:
+        return bytes([code]).decode("cp1252")
+    except UnicodeDecodeError:
+        return m.group(0)
+
+
+def parse_html(html: str):
+    """Parse a page into an `lxml.html` document tree."""
+    # Re-encoded so in-page charset declarations cannot contradict `html`.
+    html = C1_REF_RE.sub(_cp1252_ref, html)
+    return lxml.html.document_fromstring(html.encode("utf-8"), parser=PARSER)
+
+
+def _strings(element):
+    if element.text and element.tag not in SKIP_TAGS:
+        yield element.text
+    for child in element:
+        # Comments and processing instructions have a non-string tag.
+        if isinstance(child.tag, str) and child.tag not in SKIP_TAGS:
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def text_of(element, separator: str = "", strip: bool = True) -> str:
+    """Join the strings inside `element` with `separator`.
+
+    With `strip` each string is stripped and empty ones are dropped.
+    """
+    if not strip:
+        return separator.join(_strings(element))
+    return separator.join(
+        s for s in (string.strip() for string in _strings(element)) if s
+    )
+
+
+def find_anchor(root, frag: str):
+    """Return the first element named or identified by `frag`, or None."""
+    for attr in ("name", "id"):
+        found = root.xpath(f"(//*[@{attr}=$frag])[1]", frag=frag)
+        if found:
+            return found[0]
+    return None
+
+
+def next_element(element, tags):
+    """First element with one of `tags` after `element`'s start tag."""
+    found = next(element.iterdescendants(*tags), None)
+    if found is None:
+        test = " or ".join(f"self::{tag}" for tag in tags)
+        following = element.xpath(f"following::*[{test}][1]")
+        found = following[0] if following else None
+    return found
@@ -0,0 +1,196 @@
+"""Diff-based, batched writes for (re-)ingesting chapters.
+
+Importers describe a chapter as plain section and passage rows.  Every
+passage carries a hash of its text and every chapter a hash of its whole
+content, so re-importing an unchanged chapter costs one comparison.  When a
+chapter did change, `sync_chapter` works out which rows to insert, update
+or delete and which passages need their glossary links rebuilt.
+
+Nothing is written row by row: `sync_chapter` queues its changes on a
+`WriteBatch`, which the importer writes once per page with one
+``executemany`` statement per table.  The full-text index follows through
+its triggers; the in-memory search indexes are rebuilt once the caller
+bumps the corpus version.
+"""
+
+import hashlib
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects.sqlite import insert as upsert
+
+from models import Chapter, Footnote, Passage, Section, TermPassageLink
+from term_linker import TermLinker, snippet_at
+
+
+def content_hash(*parts) -> str:
+    """Return a stable digest of `parts` (``None`` hashes like ``""``)."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(("" if part is None else str(part)).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def chapter_hash(title: str, sections: list[dict], passages: list[dict]) -> str:
+    """Digest of everything `sync_chapter` would write for a chapter."""
+    return content_hash(
+        title,
+        *(f"{s['id']}|{s['title']}" for s in sections),
+        *(f"{p['id']}|{p['section']}|{p['content_hash']}" for p in passages),
+    )
+
+
+class WriteBatch:
+    """Row changes queued by `sync_chapter`, written table by table."""
+
+    def __init__(self):
+        self.chapters: list[dict] = []
+        self.sections: list[dict] = []
+        self.passages: list[dict] = []
+        self.links: list[dict] = []
+        # Upserted on (passage_id, footnote_number).
+        self.footnotes: list[dict] = []
+        self.section_updates: list[dict] = []
+        self.passage_updates: list[dict] = []
+        self.deleted_sections: list[str] = []
+        self.deleted_passages: list[str] = []
+        # Passages whose links to `unlink_terms` are rebuilt.
+        self.relinked: list[str] = []
+        self.unlink_terms: set[str] = set()
+
+    def write(self, session) -> None:
+        """Execute the queued changes and empty the batch."""
+        if self.deleted_passages:
+            for model in (TermPassageLink, Footnote):
+                session.execute(
+                    delete(model).where(model.passage_id.in_(self.deleted_passages))
+                )
+            session.execute(
+                delete(Passage).where(Passage.id.in_(self.deleted_passages))
+            )
+        if self.deleted_sections:
+            session.execute(
+                delete(Section).where(Section.id.in_(self.deleted_sections))
+            )
+        if self.relinked and self.unlink_terms:
+            session.execute(
+                delete(TermPassageLink).where(
+                    TermPassageLink.passage_id.in_(self.relinked),
+                    TermPassageLink.term_id.in_(self.unlink_terms),
+                )
+            )
+        if self.section_updates:
+            session.execute(update(Section), self.section_updates)
+        if self.passage_updates:
+            session.execute(update(Passage), self.passage_updates)
+        for model, rows in (
+            (Chapter, self.chapters),
+            (Section, self.sections),
+            (Passage, self.passages),
+            (TermPassageLink, self.links),
+        ):
+            if rows:
+                session.execute(insert(model), rows)
+        if self.footnotes:
+            stmt = upsert(Footnote)
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["passage_id", "footnote_number"],
+                    set_={"content": stmt.excluded.content},
+                ),
+                self.footnotes,
+            )
+        self.__init__()
+
+
+def sync_chapter(
+    batch: WriteBatch,
+    session,
+    work_id: int,
+    chapter_id: int,
+    sections: list[dict],
+    passages: list[dict],
+    linker: TermLinker,
+    counts: dict,
+    new: bool = False,
+) -> None:
+    """Queue the writes that make a chapter's stored rows match the given ones.
+
+    Passage rows need ``content_hash`` (see `content_hash`).  A `new`
+    chapter has nothing stored yet, so the lookups are skipped.  Links of
+    deleted passages are removed; passages that are new or whose text
+    changed get their links to `linker`'s terms rebuilt.  `counts` collects
+    the ``sections``, ``passages``, ``links`` added and the ``updated`` and
+    ``deleted`` rows.
+    """
+    stored_sections = {}
+    stored_passages = {}
+    if not new:
+        stored_sections = dict(
+            session.query(Section.id, Section.title).filter(
+                Section.work_id == work_id, Section.chapter == chapter_id
+            )
+        )
+        # Ids are "<work>.ch<chapter id>.p<n>": a key range, which (unlike
+        # SQLite's case-insensitive LIKE) is a primary-key index seek.
+        prefix = f"{work_id}.ch{chapter_id}.p"
+        stored_passages = {
+            row.id: row
+            for row in session.query(
+                Passage.id, Passage.chapter, Passage.section, Passage.content_hash
+            ).filter(Passage.id >= prefix, Passage.id < prefix[:-1] + "q")
+        }
+
+    for row in sections:
+        if row["id"] not in stored_sections:
+            batch.sections.append(row)
+            counts["sections"] += 1
+        elif stored_sections.pop(row["id"]) != row["title"]:
+            batch.section_updates.append({"id": row["id"], "title": row["title"]})
+            counts["updated"] += 1
+    batch.deleted_sections.extend(stored_sections)
+    counts["deleted"] += len(stored_sections)
+
+    relink = []
+    for row in passages:
+        stored = stored_passages.pop(row["id"], None)
+        if stored is None:
+            batch.passages.append(row)
+            counts["passages"] += 1
+            relink.append(row)
+            continue
+        if stored.content_hash != row["content_hash"]:
+            relink.append(row)
+            batch.relinked.append(row["id"])
+        elif (stored.chapter, stored.section) == (row["chapter"], row["section"]):
+            continue
+        batch.passage_updates.append(
+            {
+                "id": row["id"],
+                "chapter": row["chapter"],
+                "section": row["section"],
+                "text": row["text"],
+                "content_hash": row["content_hash"],
+                "minhash": row.get("minhash"),
+            }
+        )
+        counts["updated"] += 1
+    batch.deleted_passages.extend(stored_passages)
+    counts["deleted"] += len(stored_passages)
+
+    # Links to other works' glossaries are left to update_term_links.py.
+    batch.unlink_terms.update(linker.term_ids)
+    for row in relink:
+        text = row["text"]
+        for term_id, (start, end) in linker.find(text).items():
+            batch.links.append(
+                {
+                    "term_id": term_id,
+                    "passage_id": row["id"],
+                    "text_snippet": snippet_at(text, start, end),
+                    "match_start": start,
+                    "match_end": end,
+                    "work_id": work_id,
+                }
+            )
+            counts["links"] += 1
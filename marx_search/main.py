@@ -1,15 +1,63 @@
-from urllib.request import Request
-
-from fastapi import FastAPI, HTTPException, Query, Depends
-from sqlalchemy.orm import Session
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from fastapi import FastAPI, Header, HTTPException, Query, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
 from fastapi.middleware.cors import CORSMiddleware
-from database import SessionLocal, engine
-import models, schemas
+from pydantic import TypeAdapter
+import database
+from database import AsyncSessionLocal, SessionLocal, writer_engine
+import corpus, fts, repository, schemas, search_index
+from migrate import migrate
+from cache import LRUCache
+from response_cache import Entry, ResponseCache
+from term_linker import TermLinker, snippet_at
 import re
-from rapidfuzz import process, fuzz
+from rapidfuzz import fuzz
+
+# Schema changes go through the writer; requests only read.  Workers starting
+# together take turns (see migrate.py), so only the first one migrates.
+migrate(writer_engine)
+FTS_AVAILABLE = fts.ensure_fts(writer_engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # aiosqlite connections run on threads of their own; close them so the
+    # worker can exit.
+    await database.async_engine.dispose()
+    search_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Ordered passage ids (for fuzzy queries, the best ranked so far) and their
+# count per query and corpus version, so pages 2..N only hydrate their own
+# slice.
+search_cache = LRUCache(maxsize=256, ttl=3600)
+
+# Fuzzy results are ranked this many at first: the first pages come from one
+# partial sort, and only paging past it ranks the query again.
+FUZZY_WINDOW = 200
+
+# Validated glossary per work (None = every work) and corpus version.
+term_cache = LRUCache(maxsize=64)
+
+# Serialized bodies of the reader endpoints per path, query and corpus
+# version (see response_cache.py).
+response_cache = ResponseCache()
 
-models.Base.metadata.create_all(bind=engine)
-app = FastAPI()
+# Passage matching and scoring run here, off the event loop, so a slow
+# search never holds up cheap requests.  Separate from the thread pool
+# FastAPI runs sync endpoints in, so searches cannot use it all up either.
+search_executor = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="search"
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,39 +68,147 @@ app.add_middleware(
 )
 
 
-def get_db():
-    db = SessionLocal()
+# Blue/green publishing (see publish.py): the pointer file's stamp when the
+# current reader was opened, and the switch to a newer one in progress.
+published = database.published_stamp()
+_reload_task: asyncio.Task | None = None
+
+
+def _warm_published():
+    """Open the newly published database and build its search indexes."""
+    new_engine = database.open_reader()
+    with sessionmaker(bind=new_engine)() as db:
+        version = corpus.get_version(db)
+        index = search_index.PositionalIndex.build(db)
+        trigram_index = search_index.TrigramIndex.build(db)
+    return new_engine, index, trigram_index, version
+
+
+async def _load_published(stamp) -> None:
+    """Warm the newly published database off the event loop, then switch."""
+    global published, _reload_task
     try:
-        yield db
+        new_engine, index, trigram_index, version = (
+            await asyncio.get_running_loop().run_in_executor(
+                search_executor, _warm_published
+            )
+        )
+        await database.use_reader(new_engine, database.open_async_reader())
+        search_index.install(index, trigram_index, version)
+        search_cache.clear()
+        term_cache.clear()
+        response_cache.clear()
+        print(f"🔄 Switched to {database.current_db_path()} (version {version})")
+    except Exception as e:
+        # Keep serving the current file; the next publish tries again.
+        print(f"⚠️  Could not switch to the published database: {e}")
     finally:
-        db.close()
+        published = stamp
+        _reload_task = None
+
+
+def check_published() -> None:
+    """Start switching to a newly published database, if there is one.
+
+    Requests keep using the current file until the new one is ready.
+    """
+    global _reload_task
+    stamp = database.published_stamp()
+    if stamp == published or _reload_task is not None:
+        return
+    _reload_task = asyncio.get_running_loop().create_task(_load_published(stamp))
+
+
+async def get_async_db():
+    check_published()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# The corpus version and the database file's stamp when it was read.
+_version: tuple[tuple | None, int] = (None, 0)
+
+
+async def corpus_version(db: AsyncSession) -> int:
+    """The corpus version, re-read only after the database file changed."""
+    global _version
+    stamp = database.file_stamp(database.async_engine.url.database)
+    if stamp != _version[0]:
+        _version = (stamp, await repository.corpus_version(db))
+    return _version[1]
+
+
+async def cached_response(
+    db: AsyncSession, path: str, build, if_none_match: str | None = None
+) -> Response:
+    """Serve `path` from `response_cache`, calling `build` on a miss.
+
+    `build` returns the `Entry` (JSON body and optional ETag) to cache.
+    """
+    key = ResponseCache.key(await corpus_version(db), path)
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = await build()
+        response_cache.set(key, entry)
+    headers = {"ETag": entry.etag} if entry.etag else None
+    if entry.etag and if_none_match == entry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def to_json(adapter: TypeAdapter, value) -> bytes:
+    """Validate `value` (ORM objects allowed) and serialize it."""
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+WORKS_OUT = TypeAdapter(list[schemas.WorkOut])
+CHAPTERS_OUT = TypeAdapter(list[schemas.ChapterOut])
+CHAPTER_DATA_OUT = TypeAdapter(schemas.ChapterDataOut)
 
 
 @app.get("/works/", response_model=list[schemas.WorkOut])
-def list_works(db: Session = Depends(get_db)):
+async def list_works(db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        return Entry(to_json(WORKS_OUT, await repository.list_works(db)))
 
-    return db.query(models.Work).all()
+    return await cached_response(db, "/works/", build)
 
 
 @app.get("/works/{work_id}", response_model=schemas.WorkOut)
-def get_work(work_id: int, db: Session = Depends(get_db)):
-    work = db.query(models.Work).filter(models.Work.id == work_id).first()
+async def get_work(work_id: int, db: AsyncSession = Depends(get_async_db)):
+    work = await repository.get_work(db, work_id)
     if not work:
         raise HTTPException(status_code=404, detail="Work not found")
     return work
 
 
 @app.get("/terms/", response_model=list[schemas.TermOut])
-def list_terms(work_id: int = Query(None), db: Session = Depends(get_db)):
-    query = db.query(models.Term)
-    if work_id is not None:
-        query = query.filter(models.Term.work_id == work_id)
-    return query.all()
+async def list_terms(
+    work_id: int = Query(None), db: AsyncSession = Depends(get_async_db)
+):
+    return await cached_terms(db, work_id)
+
+
+async def cached_terms(
+    db: AsyncSession, work_id: int | None, version: int | None = None
+) -> list[schemas.TermOut]:
+    """Return the glossary of `work_id` (or of every work) from the cache."""
+    if version is None:
+        version = await corpus_version(db)
+    key = (work_id, version)
+    terms = term_cache.get(key)
+    if terms is None:
+        terms = [
+            schemas.TermOut.model_validate(t)
+            for t in await repository.list_terms(db, work_id)
+        ]
+        term_cache.set(key, terms)
+    return terms
 
 
 @app.get("/terms/{term_id}", response_model=schemas.TermOut)
-def get_term(term_id: str, db: Session = Depends(get_db)):
-    term = db.query(models.Term).filter(models.Term.id == term_id).first()
+async def get_term(term_id: str, db: AsyncSession = Depends(get_async_db)):
+    term = await repository.get_term(db, term_id)
     if not term:
         raise HTTPException(status_code=404, detail="Term not found")
     return term
@@ -62,52 +218,25 @@ def get_term(term_id: str, db: Session = Depends(get_db)):
     "/terms/{term_id}/passages",
     response_model=list[schemas.TermPassageLinkOut],
 )
-def get_term_links(
+async def get_term_links(
     term_id: str,
     work_id: int = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     page: int = 1,
     page_size: int = 10,
 ):
     offset = (page - 1) * page_size
+    rows = await repository.term_links(db, term_id, work_id, offset, page_size)
 
-    query = (
-        db.query(
-            models.Passage.id.label("id"),
-            models.TermPassageLink.passage_id,
-            models.TermPassageLink.work_id,
-            models.Passage.chapter,
-            models.Passage.section,
-            models.Passage.paragraph,
-            models.Passage.text,
-            models.Chapter.chapter_number.label("chapter_number"),
-            models.Chapter.title.label("chapter_title"),
-            models.Section.title.label("section_title"),
-        )
-        .join(
-            models.Passage,
-            models.Passage.id == models.TermPassageLink.passage_id,
-        )
-        .join(
-            models.Chapter,
-            (models.Chapter.chapter_number == models.Passage.chapter)
-            & (models.Chapter.work_id == models.Passage.work_id),
-        )
-        .outerjoin(
-            models.Section,
-            (models.Section.chapter == models.Chapter.id)
-            & (models.Section.section == models.Passage.section),
-        )
-        .filter(models.TermPassageLink.term_id == term_id)
-    )
-    if work_id is not None:
-        query = query.filter(models.TermPassageLink.work_id == work_id)
-    rows = query.offset(offset).limit(page_size).all()
+    # Snippets are stored at link time; only links predating that need the
+    # passage text.
+    missing = [row.id for row in rows if row.text_snippet is None]
+    fallback = await missing_link_snippets(db, term_id, missing) if missing else {}
 
-    # Truncate and rename to match response schema
     results = []
     for row in rows:
-        if row.text is None:
+        snippet = row.text_snippet or fallback.get(row.id)
+        if snippet is None:
             continue
         results.append(
             {
@@ -115,7 +244,7 @@ def get_term_links(
                 "chapter": row.chapter_number,
                 "section": row.section,
                 "paragraph": row.paragraph,
-                "text_snippet": extract_context_snippet(row.text, term_id),
+                "text_snippet": snippet,
                 "chapter_title": row.chapter_title,
                 "section_title": row.section_title,
                 "work_id": row.work_id,
@@ -125,125 +254,100 @@ def get_term_links(
     return results
 
 
-def extract_context_snippet(text, term, context_words=50):
-    if not text or not term:
-        return ""
-
-    # Case-insensitive search
-    pattern = re.compile(re.escape(term), re.IGNORECASE)
-    match = pattern.search(text)
-
-    if not match:
-        return text[:300] + "…"  # fallback if term not found
-
-    start_idx = match.start()
-    end_idx = match.end()
-
-    # Split text into words
-    words = text.split()
-    word_positions = []
-    idx = 0
-    for word in words:
-        pos = text.find(word, idx)
-        word_positions.append((word, pos))
-        idx = pos + len(word)
-
-    # Find word index of the match
-    match_word_index = next(
-        (i for i, (_, pos) in enumerate(word_positions) if pos >= start_idx), 0
-    )
-
-    # Get surrounding words
-    start_word = max(match_word_index - context_words, 0)
-    end_word = min(match_word_index + context_words + 1, len(words))
-
-    snippet = " ".join(words[start_word:end_word])
-    return snippet + "…" if end_word < len(words) else snippet
+async def missing_link_snippets(
+    db: AsyncSession, term_id: str, passage_ids: list[str]
+) -> dict[str, str]:
+    """Compute snippets for links stored without one."""
+    term = await repository.get_term(db, term_id)
+    linker = TermLinker([term] if term else [])
+    snippets = {}
+    for passage_id, text in await repository.passage_texts(db, passage_ids):
+        if text is None:
+            continue
+        span = linker.find(text).get(term_id)
+        snippets[passage_id] = (
+            snippet_at(text, *span) if span else text[:300] + "…"
+        )
+    return snippets
 
 
 @app.get("/terms/{term_id}/passage_count")
-def count_term_links(
-    term_id: str, work_id: int = Query(None), db: Session = Depends(get_db)
+async def count_term_links(
+    term_id: str,
+    work_id: int = Query(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    query = db.query(models.TermPassageLink).filter(
-        models.TermPassageLink.term_id == term_id
-    )
-    if work_id is not None:
-        query = query.filter(models.TermPassageLink.work_id == work_id)
-    count = query.count()
+    count = await repository.count_term_links(db, term_id, work_id)
     return {"count": count}
 
 
 @app.get("/chapters/", response_model=list[schemas.ChapterOut])
-def get_chapters(work_id: int = Query(None), db: Session = Depends(get_db)):
-    query = db.query(models.Chapter)
-    if work_id is not None:
-        query = query.filter(models.Chapter.work_id == work_id)
-    return query.order_by(models.Chapter.chapter_number).all()
+async def get_chapters(
+    work_id: int = Query(None), db: AsyncSession = Depends(get_async_db)
+):
+    async def build():
+        chapters = await repository.list_chapters(db, work_id)
+        return Entry(to_json(CHAPTERS_OUT, chapters))
+
+    path = "/chapters/" if work_id is None else f"/chapters/?work_id={work_id}"
+    return await cached_response(db, path, build)
 
 
 @app.get(
     "/chapter_data/{work_id}/{chapter_number}",
     response_model=schemas.ChapterDataOut,
 )
-def get_chapter_data(
-    work_id: int, chapter_number: int, db: Session = Depends(get_db)
+async def get_chapter_data(
+    work_id: int,
+    chapter_number: int,
+    terms: Literal["all", "work", "chapter"] = Query("all"),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    chapter = (
-        db.query(models.Chapter)
-        .filter(
-            models.Chapter.work_id == work_id,
-            models.Chapter.chapter_number == chapter_number,
-        )
-        .first()
-    )
+    """Return everything the reader needs to render one chapter.
+
+    `terms` picks the glossary sent along: every work's terms (default),
+    only this work's, or only the terms linked to passages of this chapter.
+    """
+
+    async def build():
+        payload = await chapter_data(db, work_id, chapter_number, terms)
+        return Entry(to_json(CHAPTER_DATA_OUT, payload))
+
+    path = f"/chapter_data/{work_id}/{chapter_number}?terms={terms}"
+    return await cached_response(db, path, build)
+
+
+async def chapter_data(
+    db: AsyncSession, work_id: int, chapter_number: int, terms: str
+) -> dict:
+    chapter = await repository.get_chapter(db, work_id, chapter_number)
     if not chapter:
         raise HTTPException(status_code=404, detail="Chapter not found")
 
-    passages = db.query(models.Passage).filter(
-        models.Passage.chapter == chapter_number,
-        models.Passage.work_id == work_id,
-    )
-    passages = passages.all()
-
-    sections = db.query(models.Section).filter(
-        models.Section.chapter == chapter.id
-    )
-    sections = sections.all()
+    passages = await repository.chapter_passages(db, work_id, chapter_number)
+    sections = await repository.chapter_sections(db, chapter.id)
 
-    terms = db.query(models.Term).all()
-    #     terms = db.query(models.Term).filter(models.Term.work_id == work_id).all()
+    if terms == "chapter":
+        linked_ids = await repository.chapter_term_ids(db, work_id, chapter_number)
+        chapter_terms = [
+            t for t in await cached_terms(db, None) if t.id in linked_ids
+        ]
+    else:
+        chapter_terms = await cached_terms(
+            db, work_id if terms == "work" else None
+        )
 
     # Get current part (find the highest start_chapter <= current chapter)
-    part = (
-        db.query(models.Part)
-        .filter(models.Part.start_chapter <= chapter.id)
-        .order_by(models.Part.start_chapter.desc())
-        .first()
-    )
+    part = await repository.part_for_chapter(db, work_id, chapter.id)
 
-    prev_chapter = (
-        db.query(models.Chapter)
-        .filter(
-            models.Chapter.work_id == work_id,
-            models.Chapter.chapter_number == chapter_number - 1,
-        )
-        .first()
-    )
-    next_chapter = (
-        db.query(models.Chapter)
-        .filter(
-            models.Chapter.work_id == work_id,
-            models.Chapter.chapter_number == chapter_number + 1,
-        )
-        .first()
-    )
+    prev_chapter = await repository.get_chapter(db, work_id, chapter_number - 1)
+    next_chapter = await repository.get_chapter(db, work_id, chapter_number + 1)
 
     return {
         "title": chapter.title,
         "passages": passages,
         "sections": sections,
-        "terms": terms,
+        "terms": chapter_terms,
         "part": {"number": part.number, "title": part.title} if part else None,
         "prev_chapter": (
             {
@@ -269,86 +373,52 @@ def get_chapter_data(
 
 
 @app.get("/search", response_model=schemas.SearchResults)
-def search(
+async def search(
     q: str = Query(..., min_length=2),
     exact: bool = Query(False),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     work_id: int = Query(None),
-    db: Session = Depends(get_db),
+    backend: Literal["memory", "fts"] = Query("memory"),
+    db: AsyncSession = Depends(get_async_db),
 ):
     print("Parsed exact:", exact)
-    q_lower = q.lower()
+    if backend == "fts" and not FTS_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Full-text search unavailable")
     offset = (page - 1) * page_size
-
-    # -------------------------
-    # Match Terms
-    # -------------------------
-    term_query = db.query(models.Term)
-    if work_id is not None:
-        term_query = term_query.filter(models.Term.work_id == work_id)
-    all_terms = term_query.all()
-
-    matching_terms = [
-        term
-        for term in all_terms
-        if contains_word(term.term, q_lower)
-           or fuzz.token_set_ratio(q_lower, term.term.lower()) > 90
-    ]
-
-    matching_terms = matching_terms[:10]
-
-    # -------------------------
-    # Match Passages
-    # -------------------------
-    passage_query = db.query(models.Passage)
-    if work_id is not None:
-        passage_query = passage_query.filter(models.Passage.work_id == work_id)
-    all_passages = passage_query.all()
-
-    if exact:
-        pattern = re.compile(rf'\b{re.escape(q_lower)}\b', flags=re.IGNORECASE)
-        matched_passages = [
-            p for p in all_passages
-            if pattern.search(p.text or "")
-        ]
-    else:
-        matched_passages = [
-            p
-            for p in all_passages
-            if fuzz.partial_ratio(q_lower, (p.text or "").lower()) > 80
-        ]
-
-    # Paginate
-    total_passages = len(matched_passages)
-    paginated_passages = matched_passages[offset : offset + page_size]
+    version = await corpus_version(db)
+    all_terms = await cached_terms(db, work_id, version)
+
+    matching_terms, page_ids, total_passages = (
+        await asyncio.get_running_loop().run_in_executor(
+            search_executor,
+            match_search,
+            q,
+            exact,
+            work_id,
+            backend,
+            version,
+            all_terms,
+            offset,
+            page_size,
+        )
+    )
+    paginated_passages = await repository.load_passages(db, page_ids)
 
     # Enhance with snippet and titles
     enriched_passages = []
-    for p in paginated_passages:
-        chapter = (
-            db.query(models.Chapter)
-            .filter_by(work_id=p.work_id, chapter_number=p.chapter)
-            .first()
-        )
-        section = None
-        if chapter:
-            section = (
-                db.query(models.Section)
-                .filter_by(chapter=chapter.id, section=p.section)
-                .first()
-            )
+    for p, chapter_title, section_title in paginated_passages:
         enriched_passages.append(
             {
                 "id": p.id,
-                "chapter": chapter.chapter_number if chapter else p.chapter,
+                "chapter": p.chapter,
                 "section": p.section,
                 "paragraph": p.paragraph,
                 "text": p.text,
                 "text_snippet": extract_context_snippet(p.text, q),
                 "translation": p.translation,
-                "chapter_title": chapter.title if chapter else None,
-                "section_title": section.title if section else None,
+                "chapter_title": chapter_title,
+                "section_title": section_title,
                 "work_id": p.work_id,
             }
         )
@@ -363,108 +433,129 @@ def search(
     }
 
 
-@app.get("/parts_with_chapters_sections")
-def get_parts_with_chapters_sections(
-    work_id: int | None = Query(None),
-    db: Session = Depends(get_db),
+def match_search(
+    q: str,
+    exact: bool,
+    work_id: int | None,
+    backend: str,
+    version: int,
+    terms: list[schemas.TermOut],
+    offset: int,
+    limit: int,
 ):
-    parts = db.query(models.Part).order_by(models.Part.number).all()
+    """The CPU-bound part of `search`, run on `search_executor`.
 
-    chapters_query = db.query(models.Chapter)
-    if work_id is not None:
-        chapters_query = chapters_query.filter(
-            models.Chapter.work_id == work_id
-        )
-    chapters = chapters_query.order_by(models.Chapter.chapter_number).all()
-
-    sections_query = db.query(models.Section)
-    if work_id is not None:
-        sections_query = sections_query.filter(
-            models.Section.work_id == work_id
-        )
-    sections = sections_query.all()
+    Returns the matching terms, the passage ids of one page and the number
+    of matching passages.  Opens a sync session of its own, which the
+    in-memory indexes are built from on first use.
+    """
+    q_lower = q.lower()
 
-    # Map sections to chapters
-    section_map = {}
-    for sec in sections:
-        section_map.setdefault(sec.chapter, []).append(
-            {"section": sec.section, "title": sec.title}
-        )
+    # -------------------------
+    # Match Terms
+    # -------------------------
+    matching_terms = [
+        term
+        for term in terms
+        if contains_word(term.term, q_lower)
+           or fuzz.token_set_ratio(q_lower, term.term.lower()) > 90
+    ]
 
-    # Group chapters by part
-    result = []
-    for part in parts:
-        part_chapters = [
-            {
-                "id": ch.id,
-                "chapter_number": ch.chapter_number,
-                "title": ch.title,
-                "sections": section_map.get(ch.id, []),
-            }
-            for ch in chapters
-            if part.start_chapter <= ch.id <= part.end_chapter
-        ]
+    matching_terms = matching_terms[:10]
 
-        if part_chapters:
-            result.append(
-                {
-                    "number": part.number,
-                    "title": part.title,
-                    "chapters": part_chapters,
-                }
+    # -------------------------
+    # Match Passages
+    # -------------------------
+    search_index.ensure_version(version)
+    with SessionLocal() as db:
+        if backend == "fts":
+            # Matching, bm25 ranking and paging all happen inside SQLite.
+            page_ids, total_passages = fts.search_fts(
+                db, q, exact, work_id, limit=limit, offset=offset
+            )
+            return matching_terms, page_ids, total_passages
+
+        cache_key = (q_lower, exact, work_id, version)
+        cached = search_cache.get(cache_key)
+        if exact and cached is None:
+            # Resolved through the positional index.
+            matched_ids = search_index.match_exact(db, q, work_id)
+            cached = (matched_ids, len(matched_ids))
+            search_cache.set(cache_key, cached)
+        elif not exact and (
+            cached is None
+            or len(cached[0]) < min(offset + limit, cached[1])
+        ):
+            # Passages the trigram bound rules out are skipped; results are
+            # ranked best match first, and only the best `FUZZY_WINDOW` are
+            # put in order, twice as many as needed once paged past.
+            cached = search_index.rank_fuzzy(
+                db, q, work_id, limit=max(FUZZY_WINDOW, 2 * (offset + limit))
             )
+            search_cache.set(cache_key, cached)
+    matched_ids, total_passages = cached
+    return matching_terms, matched_ids[offset : offset + limit], total_passages
 
-    return result
 
+@app.get("/cache_stats")
+def get_cache_stats():
+    """Hit/miss counters of the in-process caches, for monitoring."""
+    return {
+        "search": search_cache.stats(),
+        "terms": term_cache.stats(),
+        "responses": response_cache.stats(),
+    }
 
-@app.get("/chapters_with_sections", response_model=list[schemas.ChapterTOC])
-def get_chapters_with_sections(
-    work_id: int | None = Query(None),
-    db: Session = Depends(get_db),
-):
-    """Return chapters with their sections and optional part info."""
 
-    chapters_query = db.query(models.Chapter)
-    if work_id is not None:
-        chapters_query = chapters_query.filter(
-            models.Chapter.work_id == work_id
-        )
-    chapters = chapters_query.order_by(models.Chapter.id).all()
+async def toc_response(
+    db: AsyncSession,
+    path: str,
+    work_id: int | None,
+    field: str,
+    if_none_match: str | None,
+) -> Response:
+    """Send stored tables of contents (see `toc.py`) without re-serializing.
+
+    The ETag is the corpus version they were built at, so clients can
+    revalidate with ``If-None-Match``.
+    """
+
+    async def build():
+        tocs = await repository.tables_of_contents(db, work_id)
+        version = max((t.version for t in tocs), default=0)
+        etag = f'"toc-{"all" if work_id is None else work_id}-{version}"'
+        # Each blob is a JSON array; splice them into one.
+        items = [getattr(t, field)[1:-1] for t in tocs]
+        content = "[" + ",".join(item for item in items if item) + "]"
+        return Entry(content.encode("utf-8"), etag)
 
-    sections_query = db.query(models.Section)
     if work_id is not None:
-        sections_query = sections_query.filter(
-            models.Section.work_id == work_id
-        )
-    sections = sections_query.all()
+        path = f"{path}?work_id={work_id}"
+    return await cached_response(db, path, build, if_none_match)
 
-    parts = db.query(models.Part).order_by(models.Part.number).all()
 
-    section_map: dict[int, list[dict[str, int | str]]] = {}
-    for sec in sections:
-        section_map.setdefault(sec.chapter, []).append(
-            {"section": sec.section, "title": sec.title}
-        )
-
-    def part_for(chapter_id: int):
-        for p in parts:
-            if p.start_chapter <= chapter_id <= p.end_chapter:
-                return {"number": p.number, "title": p.title}
-        return None
+@app.get("/parts_with_chapters_sections")
+async def get_parts_with_chapters_sections(
+    work_id: int | None = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    if_none_match: str | None = Header(None),
+):
+    """Return each part of a work (or of every work) with its chapters."""
+    return await toc_response(
+        db, "/parts_with_chapters_sections", work_id, "parts", if_none_match
+    )
 
-    result = []
-    for ch in chapters:
-        result.append(
-            {
-                "id": ch.id,
-                "chapter_number": ch.chapter_number,
-                "title": ch.title,
-                "sections": section_map.get(ch.id, []),
-                "part": part_for(ch.id),
-            }
-        )
 
-    return result
+@app.get("/chapters_with_sections", response_model=list[schemas.ChapterTOC])
+async def get_chapters_with_sections(
+    work_id: int | None = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    if_none_match: str | None = Header(None),
+):
+    """Return chapters with their sections and optional part info."""
+    return await toc_response(
+        db, "/chapters_with_sections", work_id, "chapters", if_none_match
+    )
 
 
 def extract_context_snippet(text, term, context_words=40):
@@ -1,71 +1,219 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, MetaData, Table, text
-from sqlalchemy.orm import sessionmaker, declarative_base
-
-# Setup
-engine = create_engine("sqlite:///marx_texts.db")
-Session = sessionmaker(bind=engine)
-session = Session()
-Base = declarative_base()
-
-# Define Work model
-class Work(Base):
-    __tablename__ = "works"
-    id = Column(Integer, primary_key=True)
-    title = Column(String, nullable=False)
-    author = Column(String)
-    description = Column(Text)
-
-# Reflect existing tables
-metadata = MetaData()
-metadata.reflect(bind=engine)
-
-def add_column_if_missing(table_name, column_name, column_type="INTEGER"):
-    if table_name in metadata.tables:
-        table = metadata.tables[table_name]
-        if column_name not in table.columns:
-            with engine.connect() as conn:
-                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};"))
-            print(f"✅ Added '{column_name}' column to {table_name}")
-
-# Add work_id columns
-tables_to_update = ["chapters", "passages", "sections", "terms", "term_passage_link"]
-for table in tables_to_update:
-    add_column_if_missing(table, "work_id")
-
-# Create works table
-Work.__table__.create(bind=engine, checkfirst=True)
-print("✅ Ensured 'works' table exists")
-
-# Insert default work
-default_work = Work(title="Capital, Volume I", author="Karl Marx", description="The first volume of Capital.")
-session.add(default_work)
-session.commit()
-print(f"✅ Inserted work: {default_work.title} with ID {default_work.id}")
-
-# Update all tables with work_id
-session.execute(text(f"UPDATE chapters SET work_id = {default_work.id}"))
-session.execute(text(f"""
-    UPDATE passages
-    SET work_id = (
-        SELECT work_id FROM chapters WHERE chapters.id = passages.chapter
+"""Versioned schema migrations for marx_texts.db.
+
+The schema version lives in the `meta` table.  `migrate` creates missing
+tables from `models.py` (a fresh database gets the current schema in one
+go) and then applies, in order, every migration above the stored version,
+all in one transaction together with the new version number.
+Migrations check before they change anything, so a database whose tables
+already have a migration's columns or indexes is simply stamped.
+
+To change the schema, update `models.py` and append a step to
+`MIGRATIONS`; never edit one that has shipped.  Run ``python migrate.py``
+to upgrade the database.
+"""
+
+from sqlalchemy import inspect, text
+
+import toc
+from corpus import VERSION_KEY
+from models import Base
+
+SCHEMA_VERSION_KEY = "schema_version"
+# How long a process waits for another one's migration to finish.
+LOCK_TIMEOUT_MS = 10 * 60 * 1000
+
+
+def add_column(conn, table: str, column: str, column_type: str) -> bool:
+    """Add `column` to `table` unless it is already there."""
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return False
+    if column in {c["name"] for c in inspector.get_columns(table)}:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+    print(f"✅ Added '{column}' column to {table}")
+    return True
+
+
+def add_work_ids(conn) -> None:
+    """Scope every table by work (databases holding only Capital, Volume I)."""
+    if "work_id" in {c["name"] for c in inspect(conn).get_columns("chapters")}:
+        return
+    for table in ("chapters", "passages", "sections", "terms", "term_passage_link"):
+        add_column(conn, table, "work_id", "INTEGER")
+    work_id = conn.execute(
+        text(
+            "INSERT INTO works (title, author, description) VALUES "
+            "('Capital, Volume I', 'Karl Marx', 'The first volume of Capital.')"
+        )
+    ).lastrowid
+    conn.execute(text("UPDATE chapters SET work_id = :id"), {"id": work_id})
+    conn.execute(
+        text(
+            """
+            UPDATE passages
+            SET work_id = (
+                SELECT work_id FROM chapters WHERE chapters.id = passages.chapter
+            )
+            """
+        )
+    )
+    conn.execute(
+        text(
+            """
+            UPDATE sections
+            SET work_id = (
+                SELECT work_id FROM chapters WHERE chapters.id = sections.chapter
+            )
+            """
+        )
     )
-"""))
-session.execute(text(f"""
-    UPDATE sections
-    SET work_id = (
-        SELECT work_id FROM chapters WHERE chapters.id = sections.chapter
+    conn.execute(text("UPDATE terms SET work_id = :id"), {"id": work_id})
+    conn.execute(
+        text(
+            """
+            UPDATE term_passage_link
+            SET work_id = (
+                SELECT passages.work_id
+                FROM passages
+                WHERE passages.id = term_passage_link.passage_id
+            )
+            """
+        )
+    )
+    print(f"✅ Set work_id across all tables (Capital, Volume I is work {work_id})")
+
+
+def add_ingest_columns(conn) -> None:
+    """Stored link spans and the columns behind incremental, de-duplicated imports."""
+    add_column(conn, "term_passage_link", "match_start", "INTEGER")
+    add_column(conn, "term_passage_link", "match_end", "INTEGER")
+    add_column(conn, "passages", "content_hash", "VARCHAR")
+    add_column(conn, "passages", "minhash", "BLOB")
+    add_column(conn, "chapters", "source", "VARCHAR")
+    add_column(conn, "chapters", "content_hash", "VARCHAR")
+
+
+QUERY_INDEXES = {
+    "ix_chapters_work_number": ("chapters", "work_id, chapter_number"),
+    "ix_passages_work_chapter": ("passages", "work_id, chapter"),
+    "ix_sections_chapter_section": ("sections", "chapter, section"),
+    "ix_sections_work": ("sections", "work_id"),
+    "ix_terms_work": ("terms", "work_id"),
+    "ix_term_passage_link_term_work": ("term_passage_link", "term_id, work_id"),
+    "ix_term_passage_link_passage": ("term_passage_link", "passage_id"),
+    "ix_parts_start_chapter": ("parts", "start_chapter"),
+}
+
+
+def add_query_indexes(conn) -> None:
+    """Indexes for the filters and joins the API runs on every request."""
+    for name, (table, columns) in QUERY_INDEXES.items():
+        conn.execute(
+            text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        )
+
+
+def add_tables_of_contents(conn) -> None:
+    """Scope parts by work and store every work's table of contents."""
+    add_column(conn, "parts", "work_id", "INTEGER")
+    conn.execute(
+        text(
+            """
+            UPDATE parts
+            SET work_id = (
+                SELECT work_id FROM chapters WHERE chapters.id = parts.start_chapter
+            )
+            WHERE work_id IS NULL
+            """
+        )
     )
-"""))
-session.execute(text(f"UPDATE terms SET work_id = {default_work.id}"))
-session.execute(text(f"""
-    UPDATE term_passage_link
-    SET work_id = (
-        SELECT passages.work_id
-        FROM passages
-        WHERE passages.id = term_passage_link.passage_id
+    conn.execute(text("DROP INDEX IF EXISTS ix_parts_start_chapter"))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_parts_work_start"
+            " ON parts (work_id, start_chapter)"
+        )
     )
-"""))
+    version = conn.execute(
+        text("SELECT value FROM meta WHERE key = :key"), {"key": VERSION_KEY}
+    ).scalar()
+    toc.rebuild_all(conn, int(version or 0))
+
+
+# Step n brings the schema from version n - 1 to n.
+MIGRATIONS = [
+    add_work_ids,
+    add_ingest_columns,
+    add_query_indexes,
+    add_tables_of_contents,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn) -> int:
+    value = conn.execute(
+        text("SELECT value FROM meta WHERE key = :key"), {"key": SCHEMA_VERSION_KEY}
+    ).scalar()
+    return int(value) if value is not None else 0
+
+
+def is_current(engine) -> bool:
+    """Whether every table exists and every migration has been applied."""
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        if not all(inspector.has_table(t) for t in Base.metadata.tables):
+            return False
+        return get_schema_version(conn) >= SCHEMA_VERSION
+
+
+def migrate(engine) -> int:
+    """Bring the database up to `SCHEMA_VERSION`; return the version it was at.
+
+    Everything happens in one transaction that takes SQLite's write lock
+    first (``BEGIN IMMEDIATE``), so processes starting together (API
+    workers, tools) migrate one at a time: the others wait for the lock,
+    then find the schema current.
+    """
+    if is_current(engine):
+        return SCHEMA_VERSION
+    # AUTOCOMMIT hands transaction control to the statements below.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {LOCK_TIMEOUT_MS}")
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                start = _migrate(conn)
+                conn.exec_driver_sql("COMMIT")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {timeout}")
+    return start
+
+
+def _migrate(conn) -> int:
+    Base.metadata.create_all(bind=conn)
+    start = get_schema_version(conn)
+    for version, step in enumerate(MIGRATIONS[start:], start=start + 1):
+        step(conn)
+        conn.execute(
+            text(
+                "INSERT INTO meta (key, value) VALUES (:key, :value) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+            ),
+            {"key": SCHEMA_VERSION_KEY, "value": str(version)},
+        )
+    return start
+
+
+if __name__ == "__main__":
+    from database import writer_engine
 
-session.commit()
-print("✅ Set work_id across all relevant tables")
-session.close()
+    start = migrate(writer_engine)
+    if start == SCHEMA_VERSION:
+        print(f"✅ Schema is up to date (version {SCHEMA_VERSION})")
+    else:
+        print(f"✅ Migrated schema from version {start} to {SCHEMA_VERSION}")
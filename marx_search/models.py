@@ -1,22 +1,38 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+# Secondary indexes are also created by migrate.py for existing databases;
+# keep the names in sync.
+
 class Passage(Base):
     __tablename__ = "passages"
+    __table_args__ = (Index("ix_passages_work_chapter", "work_id", "chapter"),)
     id = Column(String, primary_key=True)
     chapter = Column(Integer)
     section = Column(Integer)
     paragraph = Column(Integer)
     text = Column(Text)
     translation = Column(String)
+    content_hash = Column(String)  # see ingest.content_hash
+    minhash = Column(LargeBinary)  # see dedup.signature
     work_id = Column(Integer, ForeignKey("works.id"), nullable=False)
     work = relationship("Work", backref="passages")
 
 class Term(Base):
     __tablename__ = "terms"
+    __table_args__ = (Index("ix_terms_work", "work_id"),)
     id = Column(String, primary_key=True)
     term = Column(String)
     definition = Column(Text)
@@ -27,23 +43,51 @@ class Term(Base):
 
 class TermPassageLink(Base):
     __tablename__ = "term_passage_link"
+    __table_args__ = (
+        Index("ix_term_passage_link_term_work", "term_id", "work_id"),
+        Index("ix_term_passage_link_passage", "passage_id"),
+    )
     term_id = Column(String, ForeignKey("terms.id"), primary_key=True)
     passage_id = Column(String, ForeignKey("passages.id"), primary_key=True)
     text_snippet = Column(Text)
+    # Character span of the first mention of the term in the passage text.
+    match_start = Column(Integer)
+    match_end = Column(Integer)
+    work_id = Column(Integer, ForeignKey("works.id"), nullable=False)
+
+class Footnote(Base):
+    __tablename__ = "footnotes"
+    __table_args__ = (UniqueConstraint("passage_id", "footnote_number"),)
+
+    id = Column(Integer, primary_key=True)
+    passage_id = Column(String, ForeignKey("passages.id"), nullable=False)
+    footnote_number = Column(Integer, nullable=False)
+    content = Column(Text)
     work_id = Column(Integer, ForeignKey("works.id"), nullable=False)
 
 class Chapter(Base):
     __tablename__ = "chapters"
+    __table_args__ = (
+        Index("ix_chapters_work_number", "work_id", "chapter_number"),
+    )
 
     id = Column(Integer, primary_key=True)
     chapter_number = Column(Integer, nullable=False)
     title = Column(String, nullable=False)
+    # Page URL (plus #anchor) the chapter was scraped from, and a digest of
+    # its sections and passages for change detection on re-import.
+    source = Column(String)
+    content_hash = Column(String)
     work_id = Column(Integer, ForeignKey("works.id"), nullable=False)
     work = relationship("Work", backref="chapters")
 
 
 class Section(Base):
     __tablename__ = "sections"
+    __table_args__ = (
+        Index("ix_sections_chapter_section", "chapter", "section"),
+        Index("ix_sections_work", "work_id"),
+    )
 
     id = Column(String, primary_key=True)  # e.g. v1.ch01.sec01
     chapter = Column(Integer, nullable=False)
@@ -55,12 +99,27 @@ class Section(Base):
 
 class Part(Base):
     __tablename__ = "parts"
+    __table_args__ = (Index("ix_parts_work_start", "work_id", "start_chapter"),)
 
     id = Column(Integer, primary_key=True, index=True)
     number = Column(Integer, nullable=False)
     title = Column(String, nullable=False)
+    # Chapter ids (not numbers), inclusive.
     start_chapter = Column(Integer, nullable=False)
     end_chapter = Column(Integer, nullable=False)
+    work_id = Column(Integer, ForeignKey("works.id"))
+
+
+class TableOfContents(Base):
+    """A work's table of contents as served by the API (see `toc.py`)."""
+
+    __tablename__ = "tocs"
+
+    work_id = Column(Integer, ForeignKey("works.id"), primary_key=True)
+    # Corpus version the entry was built at.
+    version = Column(Integer, nullable=False)
+    chapters = Column(Text, nullable=False)  # /chapters_with_sections JSON
+    parts = Column(Text, nullable=False)  # /parts_with_chapters_sections JSON
 
 
 class Work(Base):
@@ -71,3 +130,12 @@ class Work(Base):
     year = Column(String)
     description = Column(Text)
 
+
+
+class Meta(Base):
+    """Database-wide key/value state, e.g. the corpus version."""
+
+    __tablename__ = "meta"
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
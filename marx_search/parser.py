@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 import zipfile
@@ -5,22 +6,44 @@ import tempfile
 import requests
 import re
 from lxml import etree
-from docx import Document
-from docx.oxml.ns import qn
-from sqlalchemy import create_engine, text, func
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import func
+from corpus import CHAPTER_ID_KEY, bump_version, reserve_ids
+from database import WriterSession, writer_engine
+from dedup import (
+    DEFAULT_THRESHOLD,
+    DuplicateIndex,
+    backfill,
+    print_report,
+    to_blob,
+)
+from ingest import WriteBatch, content_hash
 from models import (
-    Base,
     Work,
     Chapter,
-    Section,
     Passage,
-)  # Make sure Footnote is defined
+)
+from migrate import migrate
+import toc
 
 # Setup DB
-engine = create_engine("sqlite:///marx_texts.db")
-Session = sessionmaker(bind=engine)
-session = Session()
+engine = writer_engine
+session = WriterSession()
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+NOTE_RE = re.compile(r"^(\d+)[\).]?\s*(.*)")
+# Rows queued before the batch is written; bounds memory on long documents.
+BATCH_SIZE = 2000
+
+
+def download(url):
+    response = requests.get(url)
+    if response.status_code != 200:
+        print("❌ Failed to download file.")
+        sys.exit(1)
+    temp_path = tempfile.mktemp(suffix=".docx")
+    with open(temp_path, "wb") as f:
+        f.write(response.content)
+    return temp_path
 
 
 def get_input_source():
@@ -33,14 +56,7 @@ def get_input_source():
         return path
     elif mode == "url":
         url = input("🌐 Enter the URL to download the .docx file: ").strip()
-        response = requests.get(url)
-        if response.status_code != 200:
-            print("❌ Failed to download file.")
-            sys.exit(1)
-        temp_path = tempfile.mktemp(suffix=".docx")
-        with open(temp_path, "wb") as f:
-            f.write(response.content)
-        return temp_path
+        return download(url)
     else:
         print("❌ Invalid input.")
         sys.exit(1)
@@ -72,7 +88,10 @@ def select_work():
     author = input("✍️  Author: ").strip()
     year = input("📅 Year (optional): ").strip()
     description = input("📝 Description (optional): ").strip()
+    return get_or_create_work(title, author, year, description)
 
+
+def get_or_create_work(title, author, year=None, description=None):
     work = session.query(Work).filter_by(title=title, author=author).first()
     if work:
         print(f"🔗 Using existing Work record with ID {work.id}")
@@ -83,50 +102,86 @@ def select_work():
         print(f"✅ Created Work: {title} with ID {work.id}")
     return work
 
+
 def extract_notes(docx_path):
     """Return a mapping of note id -> text for footnotes."""
-    with zipfile.ZipFile(docx_path) as z:
-        try:
-            xml_part = z.read("word/footnotes.xml")
-            print(xml_part[:500])
-        except KeyError:
-            print("No footnotes.xml found.")
-            return {}
-
-    notes_root = etree.fromstring(xml_part)
-    print(notes_root.nsmap)
-    for el in notes_root.iter():
-        print(el.tag)
-
-    namespaces = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
-    note_tag = "footnote"
-    found_any = False
-    for fn in notes_root.findall(".//w:footnote", namespaces):
-        found_any = True
-        fn_id = fn.get("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}id")
-        print("Found footnote ID:", fn_id)
     notes = {}
-    for fn in notes_root.findall(f"w:{note_tag}", namespaces):
-        fn_id = fn.get("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}id")
-        if fn_id in ("-1", "0"):  # these are typically footnote separators or continuation
-            continue
-        paragraphs = fn.findall(".//w:p", namespaces)
-        text = " ".join(
-            "".join(node.text for node in p.iter() if node.text) for p in paragraphs
-        )
-        notes[fn_id] = text.strip()
-
+    with zipfile.ZipFile(docx_path) as z:
+        if "word/footnotes.xml" not in z.namelist():
+            return notes
+        with z.open("word/footnotes.xml") as f:
+            for _, fn in etree.iterparse(f, tag=f"{W}footnote"):
+                fn_id = fn.get(f"{W}id")
+                # -1 and 0 are the separator and continuation notes.
+                if fn_id not in ("-1", "0"):
+                    text = " ".join(
+                        "".join(node.text for node in p.iter() if node.text)
+                        for p in fn.iter(f"{W}p")
+                    )
+                    notes[fn_id] = text.strip()
+                fn.clear(keep_tail=True)
     return notes
 
 
-def paragraph_text_with_refs(para):
+def iter_paragraphs(docx_path):
+    """Yield the top-level ``w:p`` elements of the document body in order.
+
+    ``word/document.xml`` is parsed incrementally and every body element is
+    discarded once handled, so memory stays flat on long documents.
+    Paragraphs inside tables are skipped, as python-docx's
+    ``Document.paragraphs`` does.
+    """
+    with zipfile.ZipFile(docx_path) as z, z.open("word/document.xml") as f:
+        for _, el in etree.iterparse(f, tag=(f"{W}p", f"{W}tbl", f"{W}sdt")):
+            body = el.getparent()
+            if body is None or body.tag != f"{W}body":
+                continue
+            if el.tag == f"{W}p":
+                yield el
+            el.clear(keep_tail=True)
+            while el.getprevious() is not None:
+                del body[0]
+
+
+def run_text(run):
+    """Text of a ``w:r`` the way python-docx's ``Run.text`` renders it."""
+    parts = []
+    for node in run:
+        if node.tag == f"{W}t":
+            parts.append(node.text or "")
+        elif node.tag in (f"{W}tab", f"{W}ptab"):
+            parts.append("\t")
+        elif node.tag == f"{W}br":
+            if node.get(f"{W}type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif node.tag == f"{W}cr":
+            parts.append("\n")
+        elif node.tag == f"{W}noBreakHyphen":
+            parts.append("-")
+    return "".join(parts)
+
+
+def paragraph_text(p):
+    """Text of a ``w:p`` the way python-docx's ``Paragraph.text`` renders it."""
+    parts = []
+    for child in p:
+        if child.tag == f"{W}r":
+            parts.append(run_text(child))
+        elif child.tag == f"{W}hyperlink":
+            parts.extend(run_text(r) for r in child.iterchildren(f"{W}r"))
+    return "".join(parts)
+
+
+def paragraph_text_with_refs(p):
     """Return paragraph text with <sup> markers for footnote/endnote references."""
     refs = []
     parts = []
-    for node in para._element.iter():
+    for node in p.iter():
+        if not isinstance(node.tag, str):
+            continue
         local = etree.QName(node).localname
         if local in {"footnoteReference", "endnoteReference"}:
-            fn_id = node.get(qn("w:id"))
+            fn_id = node.get(f"{W}id")
             if fn_id:
                 parts.append(f"<sup>{fn_id}</sup>")
                 refs.append(fn_id)
@@ -140,147 +195,296 @@ def paragraph_text_with_refs(para):
     return "".join(parts).strip(), refs
 
 
-def parse_and_store(docx_path, work):
-    doc = Document(docx_path)
-    footnotes = extract_notes(docx_path)
-    has_footnotes = bool(footnotes)
-    print(footnotes)
-    print("\n⚠️  This will write data to your database.")
-    confirm = input("Proceed? Type 'yes' to continue: ").strip().lower()
-    if confirm != "yes":
-        print("🛑 Aborted.")
-        sys.exit(0)
-
-    existing_chapters = {
-        c.title: c for c in session.query(Chapter).filter_by(work_id=work.id).all()
-    }
-    max_id = session.query(func.max(Chapter.id)).scalar() or 0
-    chapter_id = max_id + 1
-    paragraph_id = 1
-    chapter_title = f"Chapter {chapter_id}"
-    chapter = existing_chapters.get(chapter_title)
-    if not chapter:
-        chapter = Chapter(id=chapter_id, title=chapter_title, work_id=work.id)
-        session.add(chapter)
-        session.commit()
-    else:
-        chapter_id = chapter.id
+def is_chapter_heading(text):
+    return text.isupper() or text.lower().startswith("chapter ")
 
-    in_notes = False
-    notes_buffer = []
-    last_passage_id = None
 
-    for i, para in enumerate(doc.paragraphs):
-        plain_text = para.text.strip()
-        if not plain_text:
-            continue
+class DocxImport:
+    """Stream one .docx into the passages and footnotes of `work`.
 
-        # --- handle note parsing mode ---
-        if in_notes:
-            if plain_text.isupper() or plain_text.lower().startswith("chapter "):
-                # flush buffered notes before starting new chapter
-                for num, content in notes_buffer:
-                    session.add(
-                        Footnote(
-                            passage_id=last_passage_id,
-                            footnote_number=num,
-                            content=content.strip(),
-                        )
-                    )
-                notes_buffer = []
-                in_notes = False
-                # fall through to chapter handling
-            else:
-                m = re.match(r"^(\d+)[\).]?\s*(.*)", plain_text)
-                if m:
-                    notes_buffer.append([m.group(1), m.group(2)])
-                elif notes_buffer:
-                    notes_buffer[-1][1] += " " + plain_text
-                continue
+    The work's passage ids and hashes are loaded once up front; new
+    paragraphs are inserted, changed ones updated and unchanged ones
+    skipped, all through a `WriteBatch` written every `BATCH_SIZE` rows.
+    Stored passages the document no longer has are deleted with the last
+    batch.  New and changed paragraphs are checked against `dedup`; skipped
+    near-duplicates are not stored (and a stored copy is deleted).
+    """
 
-        if plain_text.isupper() or plain_text.lower().startswith("chapter "):
-            # new chapter starts
-            session.commit()
-            chapter_id += 1
-            paragraph_id = 1
-            chapter_title = plain_text
-            chapter = existing_chapters.get(chapter_title)
-            if not chapter:
-                chapter = Chapter(id=chapter_id, title=chapter_title, work_id=work.id)
-                session.add(chapter)
-                session.commit()
-                existing_chapters[chapter_title] = chapter
-            else:
-                chapter_id = chapter.id
-            continue
+    def __init__(self, session, work, footnotes, dedup=None):
+        self.session = session
+        self.work = work
+        self.footnotes = footnotes
+        self.dedup = dedup
+        self.signed = {}
+        if dedup is not None:
+            # The document replaces the work's passages, so they only count
+            # again as the paragraphs are read back.
+            self.signed = dedup.discard(f"{work.id}.ch")
+        self.batch = WriteBatch()
+        self.queued = 0
+        self.counts = {
+            "chapters": 0,
+            "passages": 0,
+            "updated": 0,
+            "deleted": 0,
+            "footnotes": 0,
+        }
+        self.stored = dict(
+            session.query(Passage.id, Passage.content_hash).filter(
+                Passage.work_id == work.id
+            )
+        )
+        self.chapters = {
+            c.title: c for c in session.query(Chapter).filter_by(work_id=work.id)
+        }
+        self.next_number = (
+            max((c.chapter_number for c in self.chapters.values()), default=0) + 1
+        )
+        # Passage ids this document produced, kept or unchanged.
+        self.seen = set()
+        self.chapter = None
+        self.paragraph_id = 1
+        self.last_passage_id = None
 
-        # detect start of footnotes list
-        if re.match(r"^\d+[\).]?\s+", plain_text) and paragraph_id > 1:
-            in_notes = True
-            m = re.match(r"^(\d+)[\).]?\s*(.*)", plain_text)
-            notes_buffer.append([m.group(1), m.group(2)])
-            continue
+    def start_chapter(self, title):
+        chapter = self.chapters.get(title)
+        if chapter is None:
+            floor = (self.session.query(func.max(Chapter.id)).scalar() or 0) + 1
+            chapter = Chapter(
+                id=reserve_ids(self.session, CHAPTER_ID_KEY, 1, floor),
+                chapter_number=self.next_number,
+                title=title,
+                work_id=self.work.id,
+            )
+            self.session.add(chapter)
+            self.chapters[title] = chapter
+            self.next_number += 1
+            self.counts["chapters"] += 1
+        self.chapter = chapter
+        self.paragraph_id = 1
 
-        if has_footnotes:
-            text, fn_matches = paragraph_text_with_refs(para)
-        else:
-            text = plain_text
-            fn_matches = []
-
-        passage_id = f"{work.id}.ch{chapter_id}.p{paragraph_id}"
-        last_passage_id = passage_id
-        passage = session.get(Passage, passage_id)
-        if passage:
-            passage.text = text
-        else:
-            passage = Passage(
-                id=passage_id,
-                chapter=chapter_id,
-                section=None,
-                paragraph=paragraph_id,
-                text=text,
-                translation="moore_aveling_1887",
-                work_id=work.id,
+    def add_passage(self, text, refs):
+        if self.chapter is None:
+            # Text before the first heading goes into a chapter named after
+            # the work, so re-imports find it again.
+            self.start_chapter(self.work.title)
+        paragraph = self.paragraph_id
+        self.paragraph_id += 1
+        passage_id = f"{self.work.id}.ch{self.chapter.id}.p{paragraph}"
+        digest = content_hash(text)
+        minhash = None
+        if self.dedup is not None and self.stored.get(passage_id) == digest:
+            if passage_id in self.signed:
+                self.dedup.add(passage_id, self.signed[passage_id])
+        elif self.dedup is not None:
+            sig, duplicate = self.dedup.check(passage_id, self.work.id, text)
+            minhash = to_blob(sig)
+            if duplicate is not None and self.dedup.skip:
+                # Notes after a skipped passage have nothing to attach to.
+                self.last_passage_id = None
+                if passage_id in self.stored:
+                    self.batch.deleted_passages.append(passage_id)
+                    del self.stored[passage_id]
+                    self.counts["deleted"] += 1
+                    self.queued += 1
+                return
+        if passage_id not in self.stored:
+            self.batch.passages.append(
+                {
+                    "id": passage_id,
+                    "chapter": self.chapter.chapter_number,
+                    "section": None,
+                    "paragraph": paragraph,
+                    "text": text,
+                    "translation": "moore_aveling_1887",
+                    "content_hash": digest,
+                    "minhash": minhash,
+                    "work_id": self.work.id,
+                }
             )
-            session.add(passage)
-
-        # Add footnotes from docx refs (if any)
-        for fn_id in fn_matches:
-            existing_fn = (
-                session.query(Footnote)
-                .filter_by(passage_id=passage_id, footnote_number=fn_id)
-                .first()
+            self.counts["passages"] += 1
+            self.queued += 1
+        elif self.stored[passage_id] != digest:
+            self.batch.passage_updates.append(
+                {
+                    "id": passage_id,
+                    "text": text,
+                    "content_hash": digest,
+                    "minhash": minhash,
+                }
             )
-            if existing_fn:
-                existing_fn.content = footnotes.get(fn_id, "")
+            self.counts["updated"] += 1
+            self.queued += 1
+        self.stored[passage_id] = digest
+        self.seen.add(passage_id)
+        self.last_passage_id = passage_id
+        for fn_id in refs:
+            self.add_footnote(passage_id, fn_id, self.footnotes.get(fn_id, ""))
+
+    def add_footnote(self, passage_id, number, content):
+        if passage_id is None:
+            return
+        self.batch.footnotes.append(
+            {
+                "passage_id": passage_id,
+                "footnote_number": int(number),
+                "content": content,
+                "work_id": self.work.id,
+            }
+        )
+        self.counts["footnotes"] += 1
+        self.queued += 1
+
+    def flush_notes(self, notes):
+        """Attach notes listed in the text to the passage before them."""
+        for num, content in notes:
+            self.add_footnote(self.last_passage_id, num, content.strip())
+        notes.clear()
+
+    def write(self):
+        self.batch.write(self.session)
+        self.queued = 0
+
+    def run(self, paragraphs):
+        has_footnotes = bool(self.footnotes)
+        in_notes = False
+        notes_buffer = []
+
+        for p in paragraphs:
+            plain_text = paragraph_text(p).strip()
+            if not plain_text:
+                continue
+
+            # --- handle note parsing mode ---
+            if in_notes:
+                if is_chapter_heading(plain_text):
+                    # flush buffered notes before starting new chapter
+                    self.flush_notes(notes_buffer)
+                    in_notes = False
+                    # fall through to chapter handling
+                else:
+                    m = NOTE_RE.match(plain_text)
+                    if m:
+                        notes_buffer.append([m.group(1), m.group(2)])
+                    elif notes_buffer:
+                        notes_buffer[-1][1] += " " + plain_text
+                    continue
+
+            if is_chapter_heading(plain_text):
+                self.start_chapter(plain_text)
+                continue
+
+            # detect start of footnotes list
+            if re.match(r"^\d+[\).]?\s+", plain_text) and self.paragraph_id > 1:
+                in_notes = True
+                m = NOTE_RE.match(plain_text)
+                notes_buffer.append([m.group(1), m.group(2)])
+                continue
+
+            if has_footnotes:
+                text, refs = paragraph_text_with_refs(p)
             else:
-                session.add(
-                    Footnote(
-                        passage_id=passage_id,
-                        footnote_number=fn_id,
-                        content=footnotes.get(fn_id, ""),
-                    )
-                )
+                text, refs = plain_text, []
+            self.add_passage(text, refs)
+            if self.queued >= BATCH_SIZE:
+                self.write()
 
-        paragraph_id += 1
+        # flush any trailing notes at end of document
+        self.flush_notes(notes_buffer)
+        stale = [pid for pid in self.stored if pid not in self.seen]
+        self.batch.deleted_passages.extend(stale)
+        self.counts["deleted"] += len(stale)
+        self.write()
 
-    # flush any trailing notes at end of document
-    for num, content in notes_buffer:
-        session.add(
-            Footnote(
-                passage_id=last_passage_id,
-                footnote_number=num,
-                content=content.strip(),
-            )
-        )
 
+def parse_and_store(
+    docx_path, work, confirm=True, dedup="skip", threshold=DEFAULT_THRESHOLD
+):
+    if confirm:
+        print("\n⚠️  This will write data to your database.")
+        answer = input("Proceed? Type 'yes' to continue: ").strip().lower()
+        if answer != "yes":
+            print("🛑 Aborted.")
+            sys.exit(0)
+
+    index = None
+    if dedup != "off":
+        backfill(session)
+        index = DuplicateIndex.load(session, threshold, skip=dedup == "skip")
+    importer = DocxImport(session, work, extract_notes(docx_path), index)
+    importer.run(iter_paragraphs(docx_path))
+    counts = importer.counts
+    print(
+        f"📄 {counts['chapters']} new chapters, {counts['passages']} new passages,"
+        f" {counts['updated']} updated, {counts['deleted']} deleted,"
+        f" {counts['footnotes']} footnotes."
+    )
+    if index is not None:
+        print_report(index.report, work.title, "skipped" if index.skip else "stored")
+
+    toc.rebuild(session, work.id, bump_version(session))
     session.commit()
     print("✅ All passages and footnotes imported.")
     print("📌 Done.")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import a .docx translation into marx_texts.db. "
+        "Anything not given on the command line is asked for interactively."
+    )
+    parser.add_argument("source", nargs="?", help="path or URL of the .docx file")
+    parser.add_argument("--work-id", type=int, help="update this existing work")
+    parser.add_argument("--title", help="title of the work (created if missing)")
+    parser.add_argument("--author", help="author of the work")
+    parser.add_argument("--year")
+    parser.add_argument("--description")
+    parser.add_argument(
+        "--yes", action="store_true", help="write without asking for confirmation"
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=("skip", "flag", "off"),
+        default="skip",
+        help="leave out near-duplicates of stored passages, only report them, "
+        "or do not look for them (default: skip)",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="estimated Jaccard similarity above which passages count as "
+        f"near-duplicates (default: {DEFAULT_THRESHOLD})",
+    )
+    args = parser.parse_args()
+
     print("📚 Marx Parser Booting Up")
-    work = select_work()
-    docx_path = get_input_source()
-    parse_and_store(docx_path, work)
+    migrate(engine)
+    if args.work_id is not None:
+        work = session.get(Work, args.work_id)
+        if not work:
+            print("❌ Work not found.")
+            sys.exit(1)
+    elif args.title:
+        work = get_or_create_work(
+            args.title, args.author, args.year, args.description
+        )
+    else:
+        work = select_work()
+
+    if args.source is None:
+        docx_path = get_input_source()
+    elif re.match(r"https?://", args.source):
+        docx_path = download(args.source)
+    elif os.path.exists(args.source):
+        docx_path = args.source
+    else:
+        print("❌ File not found.")
+        sys.exit(1)
+    parse_and_store(
+        docx_path,
+        work,
+        confirm=not args.yes,
+        dedup=args.dedup,
+        threshold=args.dedup_threshold,
+    )
@@ -0,0 +1,217 @@
+"""Blue/green publishing of the database.
+
+Instead of writing into the file the API is reading, an import can build a
+new generation of the database and swap it in:
+
+1. `stage` copies the live database (SQLite's online backup, so readers and
+   writers are not disturbed) to ``marx_texts.<timestamp>.db``.
+2. The import writes and commits into that copy at its own pace.
+3. `check` runs SQLite's integrity checks on the copy and compares its
+   row counts with the live database.
+4. `publish` switches the copy to WAL, syncs it to disk and atomically
+   replaces ``marx_texts.db.current`` with its name.
+
+The API stats the pointer file on every request; when it changes, it opens
+the new file, builds its search indexes in the background and only then
+moves requests over (see `main.check_published`).  Files are never renamed
+while open, so no connection ever sees another generation's WAL.
+
+A worker only notices a swap on its next request, so replaced generations
+are not deleted straight away: ``marx_texts.db.retired`` records when each
+stopped being live, and later publishes delete those retired for longer
+than `RETIRE_GRACE`.  The generation before the live one is always kept,
+for going back by hand.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+
+from corpus import VERSION_KEY
+from database import DB_PATH, POINTER_PATH, current_db_path
+from fts import FTS_TABLE
+from migrate import SCHEMA_VERSION, SCHEMA_VERSION_KEY
+
+DIRECTORY = os.path.dirname(os.path.abspath(DB_PATH))
+STEM = os.path.splitext(os.path.basename(DB_PATH))[0]
+GENERATION_RE = re.compile(rf"^{re.escape(STEM)}\.\d{{8}}-\d{{6}}(-\d+)?\.db$")
+COUNTED_TABLES = (
+    "works",
+    "chapters",
+    "sections",
+    "passages",
+    "terms",
+    "term_passage_link",
+)
+# A check fails if a table lost more than this share of its live rows.
+MAX_SHRINK = 0.05
+# Generations replaced at least this long ago (seconds) may be deleted.
+RETIRE_GRACE = 24 * 3600
+RETIRED_PATH = DB_PATH + ".retired"
+
+
+def _meta(conn, key: str) -> int:
+    try:
+        row = conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def _counts(conn) -> dict[str, int]:
+    counts = {}
+    for table in COUNTED_TABLES:
+        try:
+            (counts[table],) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        except sqlite3.OperationalError:
+            counts[table] = 0
+    return counts
+
+
+def corpus_version(path: str) -> int:
+    with closing(sqlite3.connect(path)) as conn:
+        return _meta(conn, VERSION_KEY)
+
+
+def stage() -> str:
+    """Copy the live database to a new generation file; return its path."""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(DIRECTORY, f"{STEM}.{stamp}.db")
+    n = 1
+    while os.path.exists(path):
+        n += 1
+        path = os.path.join(DIRECTORY, f"{STEM}.{stamp}-{n}.db")
+    with closing(sqlite3.connect(current_db_path())) as src:
+        with closing(sqlite3.connect(path)) as dst:
+            src.backup(dst)
+            # Back to a rollback journal until it is published.
+            dst.execute("PRAGMA journal_mode = DELETE")
+    return path
+
+
+def check(staging: str, base_version: int, max_shrink: float = MAX_SHRINK):
+    """Return the problems that should stop `staging` from going live.
+
+    `base_version` is the corpus version the copy was staged from; the live
+    database must still be at it, or another tool wrote to it since and
+    publishing would lose that write.
+    """
+    problems = []
+    with closing(sqlite3.connect(staging)) as conn:
+        result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        if result != ["ok"]:
+            problems.append("integrity_check: " + "; ".join(result[:5]))
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)
+        ).fetchone():
+            try:
+                conn.execute(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE})"
+                    " VALUES ('integrity-check')"
+                )
+            except sqlite3.DatabaseError as e:
+                problems.append(f"full-text index: {e}")
+        schema = _meta(conn, SCHEMA_VERSION_KEY)
+        if schema != SCHEMA_VERSION:
+            problems.append(f"schema version {schema}, expected {SCHEMA_VERSION}")
+        staged = _counts(conn)
+
+    with closing(sqlite3.connect(current_db_path())) as conn:
+        live = _counts(conn)
+        live_version = _meta(conn, VERSION_KEY)
+    if live_version != base_version:
+        problems.append(
+            f"the live database moved from version {base_version} to"
+            f" {live_version} while staging"
+        )
+
+    print(f"{'table':<20}{'live':>10}{'staged':>10}")
+    for table in COUNTED_TABLES:
+        print(f"{table:<20}{live[table]:>10}{staged[table]:>10}")
+        if staged[table] < live[table] * (1 - max_shrink):
+            problems.append(
+                f"{table} would shrink from {live[table]} to {staged[table]} rows"
+            )
+    return problems
+
+
+def _fsync(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def publish(staging: str) -> None:
+    """Make `staging` the live database."""
+    with closing(sqlite3.connect(staging)) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA optimize")
+    _fsync(staging)
+
+    previous = current_db_path()
+    tmp = POINTER_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(staging) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, POINTER_PATH)
+    _fsync(DIRECTORY)
+    retired = _read_retired()
+    retired[os.path.basename(previous)] = time.time()
+    _write_retired(retired)
+    prune(keep={staging, previous})
+
+
+def discard(path: str) -> None:
+    """Delete a generation file and its journals."""
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _read_retired() -> dict[str, float]:
+    """Retired generation names and when they stopped being live."""
+    retired = {}
+    try:
+        with open(RETIRED_PATH, encoding="utf-8") as f:
+            for line in f:
+                name, _, when = line.strip().partition("\t")
+                if name and when:
+                    retired[name] = float(when)
+    except FileNotFoundError:
+        pass
+    return retired
+
+
+def _write_retired(retired: dict[str, float]) -> None:
+    tmp = RETIRED_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for name, when in retired.items():
+            f.write(f"{name}\t{when}\n")
+    os.replace(tmp, RETIRED_PATH)
+
+
+def prune(keep: set[str], grace: float = RETIRE_GRACE) -> None:
+    """Delete generations retired more than `grace` seconds ago, except `keep`.
+
+    Generations never published (staging copies in progress or left behind
+    by a failed check) are not retired and are left alone.
+    """
+    keep = {os.path.basename(p) for p in keep}
+    now = time.time()
+    retired = _read_retired()
+    for name, when in list(retired.items()):
+        if name in keep or now - when < grace:
+            continue
+        if GENERATION_RE.match(name):
+            discard(os.path.join(DIRECTORY, name))
+        del retired[name]
+    _write_retired(retired)
@@ -0,0 +1,203 @@
+"""Async queries behind the API's endpoints.
+
+Every function takes an `AsyncSession` (see `database.AsyncSessionLocal`)
+and awaits its statements, so a request waiting on SQLite leaves the event
+loop free for the others.  Results are plain ORM objects or rows, loaded
+completely before returning: async sessions cannot lazy-load.
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from corpus import VERSION_KEY
+from models import (
+    Chapter,
+    Meta,
+    Part,
+    Passage,
+    Section,
+    TableOfContents,
+    Term,
+    TermPassageLink,
+    Work,
+)
+
+
+async def corpus_version(db: AsyncSession) -> int:
+    """Async `corpus.get_version`."""
+    value = await db.scalar(select(Meta.value).where(Meta.key == VERSION_KEY))
+    return int(value) if value is not None else 0
+
+
+async def list_works(db: AsyncSession) -> list[Work]:
+    return list(await db.scalars(select(Work)))
+
+
+async def get_work(db: AsyncSession, work_id: int) -> Work | None:
+    return await db.get(Work, work_id)
+
+
+async def list_terms(db: AsyncSession, work_id: int | None = None) -> list[Term]:
+    query = select(Term)
+    if work_id is not None:
+        query = query.where(Term.work_id == work_id)
+    return list(await db.scalars(query))
+
+
+async def get_term(db: AsyncSession, term_id: str) -> Term | None:
+    return await db.get(Term, term_id)
+
+
+async def count_term_links(
+    db: AsyncSession, term_id: str, work_id: int | None = None
+) -> int:
+    query = select(func.count()).where(TermPassageLink.term_id == term_id)
+    if work_id is not None:
+        query = query.where(TermPassageLink.work_id == work_id)
+    return await db.scalar(query)
+
+
+async def term_links(
+    db: AsyncSession,
+    term_id: str,
+    work_id: int | None,
+    offset: int,
+    limit: int,
+):
+    """One page of a term's links with the titles of their chapter and section."""
+    query = (
+        select(
+            Passage.id.label("id"),
+            TermPassageLink.passage_id,
+            TermPassageLink.work_id,
+            TermPassageLink.text_snippet,
+            Passage.chapter,
+            Passage.section,
+            Passage.paragraph,
+            Chapter.chapter_number.label("chapter_number"),
+            Chapter.title.label("chapter_title"),
+            Section.title.label("section_title"),
+        )
+        .join(Passage, Passage.id == TermPassageLink.passage_id)
+        .join(
+            Chapter,
+            (Chapter.chapter_number == Passage.chapter)
+            & (Chapter.work_id == Passage.work_id),
+        )
+        .outerjoin(
+            Section,
+            (Section.chapter == Chapter.id) & (Section.section == Passage.section),
+        )
+        .where(TermPassageLink.term_id == term_id)
+    )
+    if work_id is not None:
+        query = query.where(TermPassageLink.work_id == work_id)
+    return (await db.execute(query.offset(offset).limit(limit))).all()
+
+
+async def passage_texts(db: AsyncSession, passage_ids: list[str]):
+    """``(id, text)`` rows of the given passages."""
+    query = select(Passage.id, Passage.text).where(Passage.id.in_(passage_ids))
+    return (await db.execute(query)).all()
+
+
+async def list_chapters(db: AsyncSession, work_id: int | None = None) -> list[Chapter]:
+    query = select(Chapter)
+    if work_id is not None:
+        query = query.where(Chapter.work_id == work_id)
+    return list(await db.scalars(query.order_by(Chapter.chapter_number)))
+
+
+async def get_chapter(
+    db: AsyncSession, work_id: int, chapter_number: int
+) -> Chapter | None:
+    query = select(Chapter).where(
+        Chapter.work_id == work_id, Chapter.chapter_number == chapter_number
+    )
+    return (await db.scalars(query.limit(1))).first()
+
+
+async def chapter_passages(
+    db: AsyncSession, work_id: int, chapter_number: int
+) -> list[Passage]:
+    query = select(Passage).where(
+        Passage.chapter == chapter_number, Passage.work_id == work_id
+    )
+    return list(await db.scalars(query))
+
+
+async def chapter_sections(db: AsyncSession, chapter_id: int) -> list[Section]:
+    return list(await db.scalars(select(Section).where(Section.chapter == chapter_id)))
+
+
+async def chapter_term_ids(
+    db: AsyncSession, work_id: int, chapter_number: int
+) -> set[str]:
+    """Ids of the terms linked to passages of one chapter."""
+    query = (
+        select(TermPassageLink.term_id)
+        .join(Passage, Passage.id == TermPassageLink.passage_id)
+        .where(Passage.work_id == work_id, Passage.chapter == chapter_number)
+        .distinct()
+    )
+    return set(await db.scalars(query))
+
+
+async def part_for_chapter(
+    db: AsyncSession, work_id: int, chapter_id: int
+) -> Part | None:
+    """The part of `work_id` whose chapter range contains `chapter_id`.
+
+    One index seek: the part starting last at or before the chapter.
+    """
+    query = (
+        select(Part)
+        .where(Part.work_id == work_id, Part.start_chapter <= chapter_id)
+        .order_by(Part.start_chapter.desc())
+        .limit(1)
+    )
+    part = (await db.scalars(query)).first()
+    if part is None or chapter_id > part.end_chapter:
+        return None
+    return part
+
+
+async def tables_of_contents(
+    db: AsyncSession, work_id: int | None = None
+) -> list[TableOfContents]:
+    """Stored tables of contents of `work_id`, or of every work in id order."""
+    query = select(TableOfContents)
+    if work_id is not None:
+        query = query.where(TableOfContents.work_id == work_id)
+    return list(await db.scalars(query.order_by(TableOfContents.work_id)))
+
+
+async def load_passages(db: AsyncSession, ids: list[str]):
+    """Load passages by id with their chapter and section titles.
+
+    Returns ``(passage, chapter_title, section_title)`` rows in the order of
+    `ids`, fetched in a single joined query.
+    """
+    if not ids:
+        return []
+    query = (
+        select(
+            Passage,
+            Chapter.title.label("chapter_title"),
+            Section.title.label("section_title"),
+        )
+        .outerjoin(
+            Chapter,
+            (Chapter.chapter_number == Passage.chapter)
+            & (Chapter.work_id == Passage.work_id),
+        )
+        .outerjoin(
+            Section,
+            (Section.chapter == Chapter.id) & (Section.section == Passage.section),
+        )
+        .where(Passage.id.in_(ids))
+    )
+    by_id = {}
+    for row in await db.execute(query):
+        by_id.setdefault(row.Passage.id, row)
+    return [by_id[pid] for pid in ids if pid in by_id]
@@ -0,0 +1,200 @@
+"""Serialized API responses, cached per request and corpus version.
+
+The reader endpoints (works, chapters, chapter data, tables of contents)
+only change when something is imported.  Their JSON bodies are cached
+under ``"<corpus version>:<path>?<query>"``, so a hit neither queries the
+database nor serializes anything, and an import makes every older entry
+unreachable.
+
+Entries live in a `ByteLRUCache` of ``MARX_RESPONSE_CACHE_BYTES`` (64 MiB
+by default).  With ``MARX_RESPONSE_CACHE_PATH`` set, they are also kept in
+an SQLite file there, which every uvicorn worker on the machine shares;
+a worker that misses in memory looks there before building the response.
+The shared file is best effort: when it is busy or broken the request
+carries on as a miss, and a worker that cannot set it up at all runs with
+the memory layer alone.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+from cache import ByteLRUCache
+
+MAX_BYTES = int(os.environ.get("MARX_RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+DISK_PATH = os.environ.get("MARX_RESPONSE_CACHE_PATH")
+DISK_MAX_BYTES = int(
+    os.environ.get("MARX_RESPONSE_CACHE_DISK_BYTES", 512 * 1024 * 1024)
+)
+
+
+class Entry(NamedTuple):
+    body: bytes
+    etag: str | None = None
+
+
+def entry_size(entry: Entry) -> int:
+    return len(entry.body) + len(entry.etag or "")
+
+
+class DiskCache:
+    """Entries in an SQLite file shared between processes.
+
+    Least recently used entries are dropped once the bodies add up to more
+    than `max_bytes`.  Reads record their use at most once a minute per
+    entry, so hits rarely write.
+    """
+
+    TOUCH_INTERVAL = 60  # seconds
+    SETUP_TIMEOUT = 10  # seconds
+    TIMEOUT_MS = 100
+
+    def __init__(self, path: str, max_bytes: int = DISK_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._conn = sqlite3.connect(
+            path,
+            timeout=self.SETUP_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        try:
+            self._setup()
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+
+    def _setup(self) -> None:
+        # Workers starting together wait for each other here...
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                size INTEGER NOT NULL,
+                used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used)"
+        )
+        # ...but a busy cache file never holds up a request for long.
+        self._conn.execute(f"PRAGMA busy_timeout = {self.TIMEOUT_MS}")
+
+    def get(self, key: str) -> Entry | None:
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT body, etag, used FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[2] > self.TOUCH_INTERVAL:
+                    self._conn.execute(
+                        "UPDATE entries SET used = ? WHERE key = ?", (now, key)
+                    )
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Entry(row[0], row[1])
+
+    def set(self, key: str, entry: Entry) -> None:
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            return
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                        (key, entry.body, entry.etag, size, time.time()),
+                    )
+                    self._evict()
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error:
+            self.errors += 1
+
+    def _evict(self) -> None:
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY used"
+        ):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class ResponseCache:
+    """An in-memory LRU in front of an optional `DiskCache`."""
+
+    def __init__(self, max_bytes: int = MAX_BYTES, disk_path: str | None = DISK_PATH):
+        self.memory = ByteLRUCache(max_bytes, sizeof=entry_size)
+        self.disk = None
+        if disk_path:
+            try:
+                self.disk = DiskCache(disk_path)
+            except sqlite3.Error as e:
+                # Optional: carry on with the memory layer alone.
+                print(f"⚠️  Shared response cache unavailable: {e}")
+
+    @staticmethod
+    def key(version: int, path: str) -> str:
+        return f"{version}:{path}"
+
+    def get(self, key: str) -> Entry | None:
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def set(self, key: str, entry: Entry) -> None:
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+
+    def clear(self) -> None:
+        """Empty this process's memory; shared entries age out on their own."""
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
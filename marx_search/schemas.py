@@ -6,7 +6,7 @@ from pydantic import BaseModel
 class PassageOut(BaseModel):
     id: str
     chapter: int
-    section: int
+    section: Optional[int]
     paragraph: int
     text: str
     translation: str
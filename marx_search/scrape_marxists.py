@@ -1,27 +1,36 @@
+import argparse
 import os
 import re
-from urllib.parse import urljoin, urlparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import urldefrag, urljoin, urlparse
 
-import requests
-from bs4 import BeautifulSoup
-
-from sqlalchemy import create_engine, func
+from sqlalchemy import func
 from sqlalchemy.orm import sessionmaker
 
 from models import (
     Base,
     Work,
     Chapter,
-    Section,
-    Passage,
     Term,
-    TermPassageLink,
     Part,
 )
 from seed_parts import SECTIONS as PART_DEFS
-
-engine = create_engine("sqlite:///marx_texts.db")
-Session = sessionmaker(bind=engine)
+from corpus import CHAPTER_ID_KEY, bump_version, reserve_ids
+from database import WriterSession, create_sqlite_engine, writer_engine
+from dedup import DEFAULT_THRESHOLD, DuplicateIndex, backfill, print_report
+from fetcher import Fetcher, HTTPCache
+from fts import ensure_fts
+from html_parse import find_anchor, next_element, parse_html, text_of
+from ingest import WriteBatch, chapter_hash, content_hash, sync_chapter
+from migrate import migrate
+import publish
+from term_linker import TermLinker, snippet_at
+import toc
+
+engine = writer_engine
+Session = WriterSession
+HTTP_CACHE_DIR = "http_cache"
+fetcher = Fetcher(cache=HTTPCache(HTTP_CACHE_DIR))
 
 NEW_TERMS = {
     "Capital, Volume II": [
@@ -51,19 +60,11 @@ def extract_context_snippet(text: str, term: str, context_words: int = 40) -> st
     """Return a snippet of text around the first occurrence of `term`."""
     if not text:
         return ""
-    words = text.split()
     pattern = re.compile(re.escape(term), re.IGNORECASE)
     m = pattern.search(text)
     if not m:
-        return " ".join(words[: context_words * 2])
-    start_word = len(text[: m.start()].split())
-    end_word = len(text[: m.end()].split())
-    start = max(start_word - context_words, 0)
-    end = min(end_word + context_words, len(words))
-    snippet = " ".join(words[start:end])
-    if end < len(words):
-        snippet += "…"
-    return snippet
+        return " ".join(text.split()[: context_words * 2])
+    return snippet_at(text, m.start(), m.end(), context_words)
 
 
 def seed_terms(session, work: Work):
@@ -113,6 +114,7 @@ def insert_parts(session, work: Work):
                 title=title,
                 start_chapter=start_id,
                 end_chapter=end_id,
+                work_id=work.id,
             )
         )
 
@@ -124,11 +126,9 @@ def extract_year(text: str) -> str | None:
 
 def parse_index(index_url: str):
     """Return list of (full_link, label) entries and attempt to parse the year."""
-    resp = requests.get(index_url)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    root = parse_html(fetcher.get(index_url))
 
-    year = extract_year(soup.get_text())
+    year = extract_year(text_of(root, strip=False))
     entries: list[tuple[str, str]] = []
     seen: set[str] = set()
     parsed = urlparse(index_url)
@@ -137,12 +137,14 @@ def parse_index(index_url: str):
         if parsed.path.endswith("/")
         else index_url[: index_url.rfind("/") + 1]
     )
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
+    for a in root.iter("a"):
+        href = a.get("href")
+        if href is None:
+            continue
         if href.endswith(".htm") or ".htm#" in href:
             full = urljoin(base_url, href)
             if full.startswith(base_url) and full not in seen:
-                entries.append((full, a.get_text(strip=True)))
+                entries.append((full, text_of(a)))
                 seen.add(full)
     return entries, year
 
@@ -164,97 +166,317 @@ def get_or_create_work(
     return work
 
 
+HEADING_TAGS = ("h1", "h2", "h3")
+BLOCK_TAGS = ("h2", "h3", "p")
+
+
+def page_chapters(root, url: str, anchors: list[str] | None = None):
+    """Split a parsed page into ``(anchor, title, header, blocks)`` chapters.
+
+    `blocks` are the page's h2/h3/p elements in document order.  Without
+    `anchors` the whole page is one chapter (with anchor None).  Otherwise
+    each named anchor starts a chapter that runs until the next one;
+    anything before the first anchor is kept with the first chapter.
+    """
+    header = next(root.iter(*HEADING_TAGS), None)
+    blocks = list(root.iter(*BLOCK_TAGS))
+    page_title = text_of(header) if header is not None else os.path.basename(url)
+
+    starts: dict[int, str] = {}
+    for frag in anchors or []:
+        target = find_anchor(root, frag)
+        if target is None:
+            print(f"⚠️  Anchor #{frag} not found in {url}")
+            continue
+        block = target
+        if block.tag not in BLOCK_TAGS:
+            block = next(target.iterancestors(*BLOCK_TAGS), None)
+        if block is None:
+            block = next_element(target, BLOCK_TAGS)
+        if block is not None:
+            starts.setdefault(id(block), frag)
+    if not starts:
+        return [(None, page_title, header, blocks)]
+
+    chapters = []
+    preamble = []
+    for block in blocks:
+        frag = starts.get(id(block))
+        if frag is not None:
+            # A chapter opening on a heading is titled by it; otherwise by
+            # the page title and anchor.
+            heading = block if block.tag in {"h2", "h3"} else None
+            title = (
+                text_of(heading)
+                if heading is not None
+                else f"{page_title} #{frag}"
+            )
+            chapters.append(
+                (frag, title, heading, preamble if not chapters else [])
+            )
+        if chapters:
+            chapters[-1][3].append(block)
+        else:
+            preamble.append(block)
+    return chapters
+
+
+class ChapterAllocator:
+    """Hand out chapter ids and numbers, reusing those of known chapters.
+
+    Chapters already stored for the work are matched by their `source`
+    URL, or, for rows imported before sources were recorded, by title.
+    New ids are reserved from the `corpus.CHAPTER_ID_KEY` sequence in the
+    caller's transaction.
+    """
+
+    def __init__(self, session, work: Work):
+        self.session = session
+        self.by_source: dict[str, Chapter] = {}
+        self.by_title: dict[str, Chapter] = {}
+        for chapter in session.query(Chapter).filter(Chapter.work_id == work.id):
+            if chapter.source:
+                self.by_source[chapter.source] = chapter
+            else:
+                self.by_title.setdefault(chapter.title, chapter)
+        self.next_number = (
+            max((c.chapter_number for c in self.known()), default=0) + 1
+        )
+
+    def known(self):
+        yield from self.by_source.values()
+        yield from self.by_title.values()
+
+    def existing(self, source: str, title: str) -> Chapter | None:
+        chapter = self.by_source.get(source)
+        if chapter is None:
+            chapter = self.by_title.pop(title, None)
+            if chapter is not None:
+                chapter.source = source
+                self.by_source[source] = chapter
+        return chapter
+
+    def allocate(self) -> tuple[int, int]:
+        # Chapters written by tools that do not use the sequence still
+        # raise its floor.
+        floor = (self.session.query(func.max(Chapter.id)).scalar() or 0) + 1
+        chapter_id = reserve_ids(self.session, CHAPTER_ID_KEY, 1, floor)
+        chapter_number = self.next_number
+        self.next_number += 1
+        return chapter_id, chapter_number
+
+
+def chapter_content(header, blocks) -> tuple[list[str], list[tuple]]:
+    """Return a chapter's section titles and ``(section, text)`` passages.
+
+    Sections are numbered from 1 in order; passages before the first
+    section have section None.
+    """
+    sections = []
+    passages = []
+    for element in blocks:
+        if element.tag in {"h2", "h3"}:
+            if element is header:
+                continue
+            sections.append(text_of(element))
+        elif element.tag == "p":
+            text = text_of(element, " ")
+            if text:
+                passages.append((len(sections) or None, text))
+    return sections, passages
+
+
+def stage_page(url: str, html: str, anchors: list[str] | None = None) -> list:
+    """Parse a page into ``(source, title, sections, passages)`` chapters.
+
+    Staged chapters are plain data: they carry no ids and can be built in
+    another process (see `stage_work`).
+    """
+    return [
+        (f"{url}#{frag}" if frag else url, title, *chapter_content(header, blocks))
+        for frag, title, header, blocks in page_chapters(parse_html(html), url, anchors)
+    ]
+
+
 def parse_page(
     session,
     url: str,
+    chapters: ChapterAllocator,
+    work: Work,
+    counts: dict,
+    html: str | None = None,
+    anchors: list[str] | None = None,
+) -> None:
+    """Store a page's chapters, sections and passages.
+
+    The page is downloaded unless its `html` was already fetched.  With
+    `anchors` the page is split into one chapter per anchor (see
+    `page_chapters`).
+    """
+    if html is None:
+        html = fetcher.get(url)
+    linker = TermLinker(session.query(Term).filter(Term.work_id == work.id))
+    store_page(session, stage_page(url, html, anchors), chapters, work, counts, linker)
+
+
+def store_page(
+    session,
+    staged: list,
+    chapters: ChapterAllocator,
+    work: Work,
+    counts: dict,
+    linker: TermLinker,
+    dedup: DuplicateIndex | None = None,
+) -> None:
+    """Write the staged chapters of one page in a single batch."""
+    batch = WriteBatch()
+    for source, title, sections, passages in staged:
+        store_chapter(
+            session,
+            batch,
+            source,
+            title,
+            sections,
+            passages,
+            chapters,
+            work,
+            counts,
+            linker,
+            dedup,
+        )
+    batch.write(session)
+
+
+def chapter_rows(
+    sections: list[str],
+    passages: list[tuple],
     chapter_id: int,
     chapter_number: int,
     work: Work,
+) -> tuple[list[dict], list[dict]]:
+    """Build the section and passage rows of a staged chapter."""
+    section_rows = [
+        {
+            "id": f"{work.id}.ch{chapter_id}.sec{number}",
+            "chapter": chapter_id,
+            "section": number,
+            "title": title,
+            "work_id": work.id,
+        }
+        for number, title in enumerate(sections, start=1)
+    ]
+    passage_rows = [
+        {
+            "id": f"{work.id}.ch{chapter_id}.p{paragraph_id}",
+            "chapter": chapter_number,
+            "section": section,
+            "paragraph": paragraph_id,
+            "text": text,
+            "translation": "marxists.org",
+            "content_hash": content_hash(text),
+            "minhash": None,
+            "work_id": work.id,
+        }
+        for paragraph_id, (section, text) in enumerate(passages, start=1)
+    ]
+    return section_rows, passage_rows
+
+
+def store_chapter(
+    session,
+    batch: WriteBatch,
+    source: str,
+    chapter_title: str,
+    sections: list[str],
+    passages: list[tuple],
+    chapters: ChapterAllocator,
+    work: Work,
     counts: dict,
+    linker: TermLinker,
+    dedup: DuplicateIndex | None = None,
 ):
-    """Download a single page and store its chapter, sections and passages."""
-    page = requests.get(url)
-    page.raise_for_status()
-    soup = BeautifulSoup(page.text, "html.parser")
-
-    header = soup.find(["h1", "h2", "h3"])
-    chapter_title = (
-        header.get_text(strip=True) if header else os.path.basename(url)
-    )
+    """Queue one chapter on `batch`, keeping only what changed since the last import.
 
-    chapter = Chapter(
-        id=chapter_id,
-        chapter_number=chapter_number,
-        title=chapter_title,
-        work_id=work.id,
+    Passages of new or changed chapters are checked against `dedup`.
+    """
+    chapter = chapters.existing(source, chapter_title)
+    if chapter is None:
+        chapter_id, chapter_number = chapters.allocate()
+    else:
+        chapter_id, chapter_number = chapter.id, chapter.chapter_number
+
+    section_rows, passage_rows = chapter_rows(
+        sections, passages, chapter_id, chapter_number, work
+    )
+    digest = chapter_hash(chapter_title, section_rows, passage_rows)
+    new = chapter is None
+    if new:
+        batch.chapters.append(
+            {
+                "id": chapter_id,
+                "chapter_number": chapter_number,
+                "title": chapter_title,
+                "source": source,
+                "content_hash": digest,
+                "work_id": work.id,
+            }
+        )
+        counts["chapters"] += 1
+    elif chapter.content_hash == digest:
+        counts["unchanged"] += 1
+        return
+    else:
+        chapter.title = chapter_title
+        chapter.content_hash = digest
+        counts["changed"] += 1
+
+    if dedup is not None:
+        if not new:
+            dedup.discard(f"{work.id}.ch{chapter_id}.p")
+        passage_rows = dedup.filter_rows(passage_rows)
+    sync_chapter(
+        batch,
+        session,
+        work.id,
+        chapter_id,
+        section_rows,
+        passage_rows,
+        linker,
+        counts,
+        new=new,
     )
-    session.add(chapter)
-    counts["chapters"] += 1
-    session.flush()
 
-    paragraph_id = 1
-    current_section = None
-    section_count = 1
 
-    terms = session.query(Term).filter(Term.work_id == work.id).all()
+def group_links(links: list[str]) -> list[tuple[str, list[str] | None]]:
+    """Group links by page so each page is fetched and stored once.
 
-    for element in soup.find_all(["h2", "h3", "p"]):
-        if element.name in {"h2", "h3"}:
-            if element == header:
-                continue
-            sec = Section(
-                id=f"{work.id}.ch{chapter_id}.sec{section_count}",
-                chapter=chapter_id,
-                section=section_count,
-                title=element.get_text(strip=True),
-                work_id=work.id,
-            )
-            session.add(sec)
-            counts["sections"] += 1
-            current_section = section_count
-            section_count += 1
-        elif element.name == "p":
-            text = element.get_text(" ", strip=True)
-            if not text:
-                continue
-            passage = Passage(
-                id=f"{work.id}.ch{chapter_id}.p{paragraph_id}",
-                chapter=chapter_number,
-                section=current_section,
-                paragraph=paragraph_id,
-                text=text,
-                translation="marxists.org",
-                work_id=work.id,
-            )
-            session.add(passage)
-            counts["passages"] += 1
-            session.flush()
-
-            for term in terms:
-                if re.search(rf"\b{re.escape(term.term)}\b", text, re.IGNORECASE):
-                    snippet = extract_context_snippet(text, term.term)
-                    session.add(
-                        TermPassageLink(
-                            term_id=term.id,
-                            passage_id=passage.id,
-                            text_snippet=snippet,
-                            work_id=work.id,
-                        )
-                    )
-                    counts["links"] += 1
-            paragraph_id += 1
+    Returns ``(page_url, anchors)`` in first-seen order.  A page listed
+    without a fragment is stored whole (`anchors` is None) and any anchors
+    into it are dropped as duplicates; a page listed only through
+    fragments is split at those anchors.
+    """
+    pages: dict[str, list[str] | None] = {}
+    for link in links:
+        url, frag = urldefrag(link)
+        anchors = pages.setdefault(url, [])
+        if anchors is None:
+            continue
+        if not frag:
+            pages[url] = None
+        elif frag not in anchors:
+            anchors.append(frag)
+    return list(pages.items())
 
 
-def scrape_work(
-    session,
+def stage_work(
     index_url: str,
     title: str,
     author: str,
     year: str | None = None,
     description: str | None = None,
     links: list[str] | None = None,
-):
-    """Download passages from marxists.org and store them in the DB."""
+) -> dict:
+    """Download and parse a work from marxists.org without touching the DB."""
     print(f"\nScraping {title} -> {index_url}")
 
     toc_links, detected_year = parse_index(index_url)
@@ -263,82 +485,194 @@ def scrape_work(
     if links is None:
         links = [u for u, _ in toc_links] or [index_url]
 
-    work = get_or_create_work(session, title, author, year, description)
-    seed_terms(session, work)
+    staged_pages = []
+    pages = group_links(links)
+    # Pages download concurrently but are parsed in link order.
+    fetched = fetcher.get_many(url for url, _ in pages)
+    for (url, anchors), (_, html) in zip(pages, fetched):
+        try:
+            if isinstance(html, Exception):
+                raise html
+            staged_pages.append((url, stage_page(url, html, anchors)))
+        except Exception as e:
+            print(f"⚠️  Failed to scrape {url}: {e}")
+    return {
+        "title": title,
+        "author": author,
+        "year": year,
+        "description": description,
+        "pages": staged_pages,
+    }
 
-    max_id = session.query(func.max(Chapter.id)).scalar() or 0
-    next_id = max_id + 1
-    max_num = (
-        session.query(func.max(Chapter.chapter_number))
-        .filter(Chapter.work_id == work.id)
-        .scalar()
-        or 0
+
+def store_work(
+    session,
+    staged: dict,
+    confirm: bool = True,
+    dedup: str = "skip",
+    threshold: float = DEFAULT_THRESHOLD,
+    index: DuplicateIndex | None = None,
+):
+    """Write a staged work, asking before committing when `confirm` is set.
+
+    Near-duplicates of passages already stored (see `dedup.py`) are left
+    out with `dedup` ``"skip"``, only reported with ``"flag"`` and not
+    looked for with ``"off"``.  Runs storing several works pass the same
+    `index` to each, so the stored signatures are only read once.
+    """
+    title, year = staged["title"], staged["year"]
+    work = get_or_create_work(
+        session, title, staged["author"], year, staged["description"]
     )
-    next_num = max_num + 1
+    seed_terms(session, work)
 
-    counts = {"chapters": 0, "sections": 0, "passages": 0, "links": 0}
-    for link in links:
+    chapters = ChapterAllocator(session, work)
+    linker = TermLinker(session.query(Term).filter(Term.work_id == work.id))
+    if dedup == "off":
+        index = None
+    elif index is None:
+        index = DuplicateIndex.load(session, threshold, skip=dedup == "skip")
+    if index is not None:
+        index.begin()
+    counts = {
+        "chapters": 0,
+        "changed": 0,
+        "unchanged": 0,
+        "sections": 0,
+        "passages": 0,
+        "updated": 0,
+        "deleted": 0,
+        "links": 0,
+    }
+    for url, page in staged["pages"]:
         try:
-            parse_page(session, link, next_id, next_num, work, counts)
-            next_id += 1
-            next_num += 1
+            store_page(session, page, chapters, work, counts, linker, index)
         except Exception as e:
-            print(f"⚠️  Failed to scrape {link}: {e}")
+            print(f"⚠️  Failed to store {url}: {e}")
             session.rollback()
+            if index is not None:
+                # The rollback also dropped the pages stored before this one.
+                index.rollback()
+                index.begin()
 
     print(
         f"Ready to insert {counts['chapters']} chapters, {counts['sections']} sections,"
         f" {counts['passages']} passages and {counts['links']} term links for '{title}'"
         f" ({year or 'unknown'})."
     )
-    insert_parts(session, work)
-    confirm = input("Commit to database? [y/N]: ").strip().lower()
-    if confirm == "y":
-        session.commit()
-        print(f"✅ Committed {title}\n")
-    else:
+    if counts["changed"] or counts["unchanged"]:
+        print(
+            f"   {counts['changed']} known chapters changed"
+            f" ({counts['updated']} rows updated, {counts['deleted']} deleted),"
+            f" {counts['unchanged']} unchanged."
+        )
+    if index is not None:
+        print_report(index.report, title, "skipped" if index.skip else "stored")
+    if counts["unchanged"] and not any(
+        n for key, n in counts.items() if key != "unchanged"
+    ):
         session.rollback()
-        print("❌ Aborted, rolled back changes\n")
-
-
-def collect_numeric_anchors(url: str) -> list[str]:
-    """Return links to numeric anchors within a given page."""
-    anchors: list[str] = []
-    try:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        names = set()
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            if href.startswith("#"):
-                name = href[1:]
-                if re.fullmatch(r"\d+(?:\.\d+)*", name):
-                    names.add(name)
-        for name in sorted(
-            names, key=lambda s: [int(p) for p in s.split(".")]
-        ):
-            anchors.append(f"{url}#{name}")
-    except Exception:
-        pass
-    return anchors
+        if index is not None:
+            index.rollback()
+        print(f"✅ {title} is up to date\n")
+        return
+    insert_parts(session, work)
+    if confirm:
+        answer = input("Commit to database? [y/N]: ").strip().lower()
+        if answer != "y":
+            session.rollback()
+            if index is not None:
+                index.rollback()
+            print("❌ Aborted, rolled back changes\n")
+            return
+    toc.rebuild(session, work.id, bump_version(session))
+    session.commit()
+    if index is not None:
+        index.commit()
+    print(f"✅ Committed {title}\n")
 
 
-def links_capital_vol2(base: str) -> list[str]:
-    links = [urljoin(base, "ch00.htm#1885"), urljoin(base, "ch00.htm#1893")]
-    for i in range(1, 21):
-        chapter_url = urljoin(base, f"ch{i:02d}.htm")
-        links.append(chapter_url)
-        links.extend(collect_numeric_anchors(chapter_url))
+def scrape_work(
+    session,
+    index_url: str,
+    title: str,
+    author: str,
+    year: str | None = None,
+    description: str | None = None,
+    links: list[str] | None = None,
+    dedup: str = "skip",
+    threshold: float = DEFAULT_THRESHOLD,
+    confirm: bool = True,
+    index: DuplicateIndex | None = None,
+):
+    """Download passages from marxists.org and store them in the DB."""
+    staged = stage_work(index_url, title, author, year, description, links)
+    store_work(
+        session, staged, confirm, dedup=dedup, threshold=threshold, index=index
+    )
 
-    ch21_01 = urljoin(base, "ch21_01.htm")
-    links.append(ch21_01)
-    links.extend(collect_numeric_anchors(ch21_01))
 
-    ch21_02 = urljoin(base, "ch21_02.htm")
-    links.append(ch21_02)
-    links.extend(collect_numeric_anchors(ch21_02))
+def _init_worker(cache_dir: str, offline: bool, rate: float) -> None:
+    global fetcher
+    # Workers never touch the database; drop the parent's pooled connection
+    # without closing it under the parent.
+    engine.dispose(close=False)
+    fetcher = Fetcher(cache=HTTPCache(cache_dir), offline=offline, rate=rate)
+
+
+def _stage(spec: dict) -> dict:
+    return stage_work(
+        spec["url"], spec["title"], spec["author"], links=spec.get("links")
+    )
 
+
+def scrape_parallel(
+    works: list[dict],
+    jobs: int,
+    cache_dir: str = HTTP_CACHE_DIR,
+    offline: bool = False,
+    rate: float = 4.0,
+    dedup: str = "skip",
+    threshold: float = DEFAULT_THRESHOLD,
+    index: DuplicateIndex | None = None,
+) -> None:
+    """Fetch and parse `works` in `jobs` processes and store them here.
+
+    Only this process writes, one work per transaction as soon as its
+    staging finishes, without prompting.  The request `rate` is shared
+    between the workers.
+    """
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(cache_dir, offline, rate / jobs),
+    ) as pool:
+        futures = {pool.submit(_stage, spec): spec for spec in works}
+        for future in as_completed(futures):
+            try:
+                staged = future.result()
+            except Exception as e:
+                print(f"⚠️  Failed to scrape {futures[future]['title']}: {e}")
+                continue
+            with Session() as session:
+                store_work(
+                    session,
+                    staged,
+                    confirm=False,
+                    dedup=dedup,
+                    threshold=threshold,
+                    index=index,
+                )
+
+
+def links_capital_vol2(base: str) -> list[str]:
+    # Numbered sections inside each chapter page become sections of that
+    # chapter; only the two prefaces sharing ch00.htm are split by anchor.
+    links = [urljoin(base, "ch00.htm#1885"), urljoin(base, "ch00.htm#1893")]
+    for i in range(1, 21):
+        links.append(urljoin(base, f"ch{i:02d}.htm"))
+    links.append(urljoin(base, "ch21_01.htm"))
+    links.append(urljoin(base, "ch21_02.htm"))
     return links
 
 
@@ -352,6 +686,49 @@ def links_capital_vol3(base: str) -> list[str]:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import works from marxists.org into marx_texts.db."
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="replay pages from the HTTP cache only; never touch the network",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=HTTP_CACHE_DIR,
+        help=f"directory of cached pages (default: {HTTP_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="fetch and parse this many works in parallel processes and "
+        "commit each without prompting (default: 1, one work at a time)",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=("skip", "flag", "off"),
+        default="skip",
+        help="leave out near-duplicates of stored passages, only report them, "
+        "or do not look for them (default: skip)",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="estimated Jaccard similarity above which passages count as "
+        f"near-duplicates (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--publish",
+        action="store_true",
+        help="build into a staging copy of the database, check it and swap it "
+        "in for the API at the end; commits each work without prompting",
+    )
+    args = parser.parse_args()
+    fetcher = Fetcher(cache=HTTPCache(args.cache_dir), offline=args.offline)
+
     works = [
             {
                 "url": "https://www.marxists.org/archive/marx/works/1844/epm/index.htm",
@@ -422,14 +799,62 @@ if __name__ == "__main__":
         # },
     ]
 
-    for w in works:
+    if args.publish:
+        # The live database is only read (to copy it) until the swap.
+        staging = publish.stage()
+        base_version = publish.corpus_version(staging)
+        print(f"📦 Staging into {staging}")
+        engine = create_sqlite_engine(staging, profile="staging")
+        Session = sessionmaker(bind=engine)
+
+    # Triggers on `passages` keep the full-text index in sync while scraping.
+    migrate(engine)
+    ensure_fts(engine)
+    index = None
+    if args.dedup != "off":
         with Session() as session:
-            scrape_work(
-                session,
-                w["url"],
-                w["title"],
-                w["author"],
-                links=w.get("links"),
+            backfill(session)
+            session.commit()
+            # Read once, then kept up to date as each work is stored.
+            index = DuplicateIndex.load(
+                session, args.dedup_threshold, skip=args.dedup == "skip"
             )
+    if args.jobs > 1:
+        scrape_parallel(
+            works,
+            args.jobs,
+            args.cache_dir,
+            args.offline,
+            dedup=args.dedup,
+            threshold=args.dedup_threshold,
+            index=index,
+        )
+    else:
+        for w in works:
+            with Session() as session:
+                scrape_work(
+                    session,
+                    w["url"],
+                    w["title"],
+                    w["author"],
+                    links=w.get("links"),
+                    dedup=args.dedup,
+                    threshold=args.dedup_threshold,
+                    confirm=not args.publish,
+                    index=index,
+                )
 
     print("\n✅ Done scraping all works.")
+    if args.publish:
+        engine.dispose()
+        if publish.corpus_version(staging) == base_version:
+            publish.discard(staging)
+            print("✅ Nothing changed; nothing to publish.")
+        elif problems := publish.check(staging, base_version):
+            for problem in problems:
+                print(f"❌ {problem}")
+            print(f"🛑 Not published; the staging copy is left at {staging}")
+            raise SystemExit(1)
+        else:
+            publish.publish(staging)
+            print(f"🚀 Published {os.path.basename(staging)}")
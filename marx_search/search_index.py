@@ -0,0 +1,424 @@
+"""In-memory indexes used by `/search`.
+
+`PositionalIndex` maps every lower-cased ``\\w+`` token to the passages it
+occurs in and the token positions inside each passage.  Phrase lookups
+intersect the posting lists (rarest token first) and check that the tokens
+appear at consecutive positions, so only passages that can contain the
+phrase are ever loaded from the database.
+
+`TrigramIndex` keeps the lower-cased passage texts, which fuzzy queries are
+scored against, and a character-trigram index over them.  Queries only score
+passages that share enough trigrams to still reach the match threshold.  The
+bound never drops a match, which at the default threshold means it can never
+rule a passage out; the trigram postings are therefore only built the first
+time a query at a stricter threshold can use them.
+"""
+
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from sqlalchemy import literal_column
+from sqlalchemy.orm import Session
+
+import models
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split `text` into lower-cased word tokens."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def exact_pattern(q: str) -> re.Pattern:
+    """Return the whole-word pattern exact searches are defined by."""
+    return re.compile(rf"\b{re.escape(q.lower())}\b", flags=re.IGNORECASE)
+
+
+class Postings:
+    """Documents and positions for a single token.
+
+    ``docs`` is sorted ascending; the positions of ``docs[i]`` are
+    ``positions[starts[i]:starts[i + 1]]``.
+    """
+
+    __slots__ = ("docs", "starts", "positions")
+
+    def __init__(self):
+        self.docs = array("I")
+        self.starts = array("I")
+        self.positions = array("I")
+
+    def add(self, doc: int, positions: list[int]) -> None:
+        self.docs.append(doc)
+        self.starts.append(len(self.positions))
+        self.positions.extend(positions)
+
+    def find(self, doc: int) -> int:
+        """Return the slot of `doc` in ``docs`` or -1 when absent."""
+        i = bisect_left(self.docs, doc)
+        if i < len(self.docs) and self.docs[i] == doc:
+            return i
+        return -1
+
+    def positions_at(self, slot: int) -> array:
+        end = (
+            self.starts[slot + 1]
+            if slot + 1 < len(self.starts)
+            else len(self.positions)
+        )
+        return self.positions[self.starts[slot] : end]
+
+
+class PositionalIndex:
+    """Token -> passage/position index built from the `passages` table.
+
+    Documents are numbered in table order, so results come back in the same
+    order a plain ``SELECT * FROM passages`` would return them.
+    """
+
+    def __init__(self):
+        self.passage_ids: list[str] = []
+        self.work_ids: list[int] = []
+        self.postings: dict[str, Postings] = {}
+
+    @classmethod
+    def build(cls, db: Session) -> "PositionalIndex":
+        index = cls()
+        rows = db.query(
+            models.Passage.id, models.Passage.work_id, models.Passage.text
+        ).order_by(literal_column("passages.rowid"))
+        for passage_id, work_id, text in rows:
+            index.add(passage_id, work_id, text or "")
+        return index
+
+    def add(self, passage_id: str, work_id: int, text: str) -> None:
+        doc = len(self.passage_ids)
+        self.passage_ids.append(passage_id)
+        self.work_ids.append(work_id)
+
+        local: dict[str, list[int]] = {}
+        for pos, token in enumerate(tokenize(text)):
+            local.setdefault(token, []).append(pos)
+        for token, positions in local.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = Postings()
+            postings.add(doc, positions)
+
+    def __len__(self) -> int:
+        return len(self.passage_ids)
+
+    def phrase_docs(self, tokens: list[str], work_id: int | None = None):
+        """Return document numbers containing `tokens` as a contiguous run."""
+        lists = []
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                return []
+            lists.append(postings)
+
+        # Drive the intersection from the shortest posting list.
+        anchor = min(range(len(lists)), key=lambda i: len(lists[i].docs))
+        anchor_postings = lists[anchor]
+
+        matches = []
+        for slot, doc in enumerate(anchor_postings.docs):
+            if work_id is not None and self.work_ids[doc] != work_id:
+                continue
+            if len(tokens) == 1:
+                matches.append(doc)
+                continue
+
+            others = []
+            for i, postings in enumerate(lists):
+                if i == anchor:
+                    continue
+                other_slot = postings.find(doc)
+                if other_slot < 0:
+                    break
+                others.append((i - anchor, set(postings.positions_at(other_slot))))
+            else:
+                for pos in anchor_postings.positions_at(slot):
+                    if all(pos + offset in positions for offset, positions in others):
+                        matches.append(doc)
+                        break
+        return matches
+
+
+FUZZY_THRESHOLD = 80
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Character-trigram index over lower-cased passage texts.
+
+    ``postings[gram]`` lists (ascending) every document containing `gram`;
+    it stays None until a query needs it (see `candidates`).
+    """
+
+    def __init__(self):
+        self.passage_ids: list[str] = []
+        self.work_ids: list[int] = []
+        self.texts: list[str] = []
+        self.postings: dict[str, array] | None = None
+        self._postings_lock = threading.Lock()
+        self._by_length: list[tuple[int, int]] | None = None
+
+    @classmethod
+    def build(cls, db: Session) -> "TrigramIndex":
+        index = cls()
+        rows = db.query(
+            models.Passage.id, models.Passage.work_id, models.Passage.text
+        ).order_by(literal_column("passages.rowid"))
+        for passage_id, work_id, text in rows:
+            index.add(passage_id, work_id, text or "")
+        return index
+
+    def add(self, passage_id: str, work_id: int, text: str) -> None:
+        doc = len(self.passage_ids)
+        text = text.lower()
+        self.passage_ids.append(passage_id)
+        self.work_ids.append(work_id)
+        self.texts.append(text)
+        if self.postings is not None:
+            self._index_text(self.postings, doc, text)
+        self._by_length = None
+
+    @staticmethod
+    def _index_text(postings: dict[str, array], doc: int, text: str) -> None:
+        for gram in trigrams(text):
+            docs = postings.get(gram)
+            if docs is None:
+                docs = postings[gram] = array("I")
+            docs.append(doc)
+
+    def trigram_postings(self) -> dict[str, array]:
+        """The trigram postings, built on first use."""
+        if self.postings is None:
+            with self._postings_lock:
+                if self.postings is None:
+                    postings = {}
+                    for doc, text in enumerate(self.texts):
+                        self._index_text(postings, doc, text)
+                    self.postings = postings
+        return self.postings
+
+    def __len__(self) -> int:
+        return len(self.passage_ids)
+
+    def shorter_than(self, length: int) -> list[int]:
+        """Documents whose text is shorter than `length` characters."""
+        if self._by_length is None:
+            self._by_length = sorted(
+                (len(text), doc) for doc, text in enumerate(self.texts)
+            )
+        end = bisect_right(self._by_length, (length - 1, len(self.texts)))
+        return [doc for _, doc in self._by_length[:end]]
+
+    def candidates(
+        self,
+        q_lower: str,
+        work_id: int | None = None,
+        threshold: int = FUZZY_THRESHOLD,
+    ) -> list[int]:
+        """Documents that could score above `threshold` against `q_lower`.
+
+        A passage needs at least ``len(grams) - max_lost_trigrams(...)`` of the
+        query's trigrams to reach the threshold (see `max_lost_trigrams`);
+        passages no longer than the query swap roles in ``partial_ratio`` and
+        are always kept.  When the bound allows every trigram to be lost, as it
+        does for short queries and at the default `FUZZY_THRESHOLD`, all
+        documents are returned without touching the postings.
+        """
+        if work_id is None:
+            docs = range(len(self))
+        else:
+            docs = [d for d, w in enumerate(self.work_ids) if w == work_id]
+
+        grams = trigrams(q_lower)
+        needed = len(grams) - max_lost_trigrams(len(q_lower), threshold)
+        if needed <= 0:
+            return list(docs)
+
+        index = self.trigram_postings()
+        counts = Counter()
+        for gram in grams:
+            postings = index.get(gram)
+            if postings is not None:
+                counts.update(postings)
+        keep = {doc for doc, n in counts.items() if n >= needed}
+        keep.update(self.shorter_than(len(q_lower) + 1))
+        return [doc for doc in docs if doc in keep]
+
+
+def max_lost_trigrams(length: int, threshold: int = FUZZY_THRESHOLD) -> int:
+    """The most trigrams a `length`-character query can lose and still score
+    above `threshold` with ``partial_ratio``.
+
+    ``partial_ratio`` is the Indel ratio between the query and its best
+    window of the passage, ``100 * (1 - d / (length + w))`` for a window of
+    ``w <= length`` characters (shorter only where it overhangs the start or
+    end of the passage) at Indel distance ``d``.  Turning the query into the
+    window deletes ``(d + length - w) / 2`` of its characters, each breaking
+    at most three of its trigrams, and inserts ``(d - length + w) / 2``,
+    each breaking at most two.  Every other trigram survives in the window
+    and so in the passage.
+    """
+    lost = 0
+    for w in range(length + 1):
+        # Largest distance scoring above the threshold; a tie is allowed too
+        # so float rounding in rapidfuzz cannot push a hit past the bound.
+        d = (length + w) * (100 - threshold) // 100
+        if d < length - w:
+            continue
+        deleted = (d + length - w) // 2
+        lost = max(lost, 3 * deleted + 2 * (d - deleted))
+    return lost
+
+
+_index: PositionalIndex | None = None
+_trigram_index: TrigramIndex | None = None
+_index_version: int | None = None
+_index_lock = threading.Lock()
+
+
+def get_index(db: Session) -> PositionalIndex:
+    """Return the process-wide positional index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PositionalIndex.build(db)
+    return _index
+
+
+def get_trigram_index(db: Session) -> TrigramIndex:
+    """Return the process-wide trigram index, building it on first use."""
+    global _trigram_index
+    if _trigram_index is None:
+        with _index_lock:
+            if _trigram_index is None:
+                _trigram_index = TrigramIndex.build(db)
+    return _trigram_index
+
+
+def invalidate() -> None:
+    """Drop the cached indexes so the next search rebuilds them."""
+    global _index, _trigram_index
+    with _index_lock:
+        _index = None
+        _trigram_index = None
+
+
+def ensure_version(version: int) -> None:
+    """Drop indexes that were built for a different corpus version."""
+    global _index, _trigram_index, _index_version
+    with _index_lock:
+        if version != _index_version:
+            _index = None
+            _trigram_index = None
+            _index_version = version
+
+
+def install(
+    index: PositionalIndex, trigram_index: TrigramIndex, version: int
+) -> None:
+    """Swap in indexes built ahead of time for corpus `version`."""
+    global _index, _trigram_index, _index_version
+    with _index_lock:
+        _index = index
+        _trigram_index = trigram_index
+        _index_version = version
+
+
+def scan_exact(db: Session, q: str, work_id: int | None = None) -> list[str]:
+    """Match every passage against the exact-search regex (no index)."""
+    query = db.query(models.Passage.id, models.Passage.text)
+    if work_id is not None:
+        query = query.filter(models.Passage.work_id == work_id)
+    pattern = exact_pattern(q)
+    return [pid for pid, text in query if pattern.search(text or "")]
+
+
+def match_exact(db: Session, q: str, work_id: int | None = None) -> list[str]:
+    """Return ids of passages matching `q` as a whole word/phrase, in table order."""
+    tokens = tokenize(q)
+    if not tokens:
+        # Nothing to look up (punctuation-only query); fall back to a scan.
+        return scan_exact(db, q, work_id)
+
+    index = get_index(db)
+    ids = [index.passage_ids[doc] for doc in index.phrase_docs(tokens, work_id)]
+    if TOKEN_RE.fullmatch(q.lower()) or not ids:
+        return ids
+
+    # Multi-token or punctuated queries: the index guarantees the tokens are
+    # adjacent, the regex confirms the separators between them.
+    pattern = exact_pattern(q)
+    texts = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start : start + 500]
+        rows = db.query(models.Passage.id, models.Passage.text).filter(
+            models.Passage.id.in_(chunk)
+        )
+        texts.update(rows)
+    return [pid for pid in ids if pattern.search(texts.get(pid) or "")]
+
+
+def scan_fuzzy(db: Session, q: str, work_id: int | None = None) -> list[str]:
+    """Score every passage with ``partial_ratio`` (no index)."""
+    query = db.query(models.Passage.id, models.Passage.text)
+    if work_id is not None:
+        query = query.filter(models.Passage.work_id == work_id)
+    q_lower = q.lower()
+    return [
+        pid
+        for pid, text in query
+        if fuzz.partial_ratio(q_lower, (text or "").lower()) > FUZZY_THRESHOLD
+    ]
+
+
+def rank_fuzzy(
+    db: Session, q: str, work_id: int | None = None, limit: int | None = None
+) -> tuple[list[str], int]:
+    """Return the best `limit` fuzzy matches for `q` and the total match count.
+
+    Candidates are scored in one ``cdist`` call spread over every core; the
+    top `limit` are then picked with a heap, best score first and table order
+    among equal scores.
+    """
+    index = get_trigram_index(db)
+    q_lower = q.lower()
+    docs = index.candidates(q_lower, work_id)
+    if not docs:
+        return [], 0
+
+    scores = process.cdist(
+        [q_lower],
+        [index.texts[doc] for doc in docs],
+        scorer=fuzz.partial_ratio,
+        score_cutoff=FUZZY_THRESHOLD,
+        dtype=np.float64,
+        workers=-1,
+    )[0]
+    hits = [
+        (score, -doc)
+        for doc, score in zip(docs, scores.tolist())
+        if score > FUZZY_THRESHOLD
+    ]
+    if limit is None:
+        best = sorted(hits, reverse=True)
+    else:
+        best = heapq.nlargest(limit, hits)
+    return [index.passage_ids[-neg_doc] for _, neg_doc in best], len(hits)
@@ -1,9 +1,7 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from corpus import bump_version
+from database import WriterSession as Session
 from models import Part, Work, Chapter
-
-engine = create_engine("sqlite:///marx_texts.db")
-Session = sessionmaker(bind=engine)
+import toc
 
 SECTIONS = {
     "Capital, Volume I": [
@@ -34,6 +32,7 @@ SECTIONS = {
 
 def main():
     with Session() as session:
+        changed = set()
         for work_title, parts in SECTIONS.items():
             work = session.query(Work).filter(Work.title == work_title).first()
             if not work:
@@ -67,9 +66,15 @@ def main():
                     title=title,
                     start_chapter=start_id,
                     end_chapter=end_id,
+                    work_id=work.id,
                 )
                 session.add(part)
+                changed.add(work.id)
                 print(f"Added part {number} for '{work_title}'.")
+        if changed:
+            version = bump_version(session)
+            for work_id in changed:
+                toc.rebuild(session, work_id, version)
         session.commit()
         print("✅ Parts inserted.")
 
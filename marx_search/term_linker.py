@@ -0,0 +1,115 @@
+"""Single-pass glossary term matching shared by the scraper and relinker.
+
+All term strings and their comma-separated aliases are compiled into one
+trie-shaped regular expression, so a passage is scanned once no matter how
+many terms the glossary holds.  Matching follows the historical per-term
+rule: case-insensitive, whole words (``\\bterm\\b``).
+"""
+
+import re
+from typing import Iterable
+
+from models import Term
+
+
+def term_surfaces(term: Term) -> list[str]:
+    """Return the strings that count as a mention of `term`."""
+    surfaces = [term.term] if term.term else []
+    if term.aliases:
+        surfaces.extend(a.strip() for a in term.aliases.split(","))
+    return [s for s in surfaces if s]
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Build an alternation of `words` that shares common prefixes.
+
+    Optional suffixes are greedy, so the longest word matches first and the
+    engine backtracks to shorter ones only if the word boundary fails.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alternatives = [
+            re.escape(ch) + build(child)
+            for ch, child in sorted(node.items())
+            if ch
+        ]
+        if not alternatives:
+            return ""
+        body = (
+            alternatives[0]
+            if len(alternatives) == 1
+            else "(?:" + "|".join(alternatives) + ")"
+        )
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class TermLinker:
+    """Find every glossary term mentioned in a passage in one pass."""
+
+    def __init__(self, terms: Iterable[Term]):
+        # Lower-cased surface -> ids of the terms it stands for.
+        self.surfaces: dict[str, list[str]] = {}
+        self.term_ids: list[str] = []
+        for term in terms:
+            self.term_ids.append(term.id)
+            for surface in term_surfaces(term):
+                ids = self.surfaces.setdefault(surface.lower(), [])
+                if term.id not in ids:
+                    ids.append(term.id)
+
+        # Shorter surfaces that are prefixes of a longer one (e.g. "money" in
+        # "money capital") are shadowed by the longer match at the same
+        # offset and are re-checked explicitly.
+        self._prefixes: dict[str, list[tuple[str, re.Pattern]]] = {}
+        for surface in self.surfaces:
+            for other in self.surfaces:
+                if other != surface and surface.startswith(other):
+                    pattern = re.compile(rf"{re.escape(other)}\b", re.IGNORECASE)
+                    self._prefixes.setdefault(surface, []).append((other, pattern))
+
+        self._pattern = (
+            re.compile(
+                rf"(?=\b({_trie_regex(self.surfaces)})\b)", re.IGNORECASE
+            )
+            if self.surfaces
+            else None
+        )
+
+    def find(self, text: str) -> dict[str, tuple[int, int]]:
+        """Map each term id found in `text` to the span of its first mention."""
+        found: dict[str, tuple[int, int]] = {}
+        if self._pattern is None or not text:
+            return found
+        for m in self._pattern.finditer(text):
+            start = m.start(1)
+            surface = m.group(1).lower()
+            hits = [(surface, m.end(1))]
+            for prefix, pattern in self._prefixes.get(surface, ()):
+                pm = pattern.match(text, start)
+                if pm:
+                    hits.append((prefix, pm.end()))
+            for hit, end in hits:
+                for term_id in self.surfaces.get(hit, ()):
+                    found.setdefault(term_id, (start, end))
+        return found
+
+
+def snippet_at(text: str, start: int, end: int, context_words: int = 40) -> str:
+    """Return `context_words` words either side of ``text[start:end]``."""
+    words = text.split()
+    start_word = len(text[:start].split())
+    end_word = len(text[:end].split())
+    first = max(start_word - context_words, 0)
+    last = min(end_word + context_words, len(words))
+    snippet = " ".join(words[first:last])
+    if last < len(words):
+        snippet += "…"
+    return snippet
@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# The modules import each other by bare name, as when run from marx_search/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# `database` opens MARX_DB_PATH on import; point the API at a scratch file.
+API_DIR = tempfile.mkdtemp(prefix="marx-tests-")
+os.environ["MARX_DB_PATH"] = os.path.join(API_DIR, "api.db")
+
+import models  # noqa: E402
+from database import create_sqlite_engine  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_sqlite_engine(str(tmp_path / "test.db"))
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def api():
+    """`main` and a test client, over a synthetic corpus of two works."""
+    from fastapi.testclient import TestClient
+
+    import database
+    from bench_search import build_corpus
+
+    engine = create_sqlite_engine(database.DB_PATH)
+    models.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        build_corpus(session, works=2, passages_per_work=300)
+        for work_id in (1, 2):
+            for number in range(1, 8):
+                session.add(
+                    models.Chapter(
+                        work_id=work_id,
+                        chapter_number=number,
+                        title=f"Chapter {number}",
+                    )
+                )
+        session.commit()
+    engine.dispose()
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield main, client
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(API_DIR, ignore_errors=True)
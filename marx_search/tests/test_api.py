@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import database
+
+
+@contextmanager
+def count_statements():
+    """Count the SQL statements run on the API's sync and async readers."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = [database.engine, database.async_engine.sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+
+
+def test_search_statements_do_not_grow_with_page_size(api):
+    main, client = api
+    # Build the search indexes and read the corpus version first.
+    assert client.get("/search", params={"q": "capital"}).status_code == 200
+
+    counts = {}
+    for page_size in (10, 100):
+        main.search_cache.clear()
+        main.term_cache.clear()
+        with count_statements() as statements:
+            response = client.get(
+                "/search", params={"q": "capital", "page_size": page_size}
+            )
+        assert response.status_code == 200
+        assert len(response.json()["passages"]) == page_size
+        counts[page_size] = len(statements)
+
+    assert counts[10] == counts[100]
@@ -0,0 +1,114 @@
+from sqlalchemy import event
+
+import models
+import scrape_marxists
+from dedup import DuplicateIndex, signature
+
+PREFACE = (
+    "The work, the first volume of which I now submit to the public, forms "
+    "the continuation of my Zur Kritik der Politischen Oekonomie, published "
+    "in 1859."
+)
+OTHER = (
+    "The wealth of those societies in which the capitalist mode of "
+    "production prevails presents itself as an immense accumulation of "
+    "commodities."
+)
+
+
+def staged(title: str, *texts: str) -> dict:
+    url = f"https://example.org/{title}/ch01.htm"
+    passages = [(None, text) for text in texts]
+    return {
+        "title": title,
+        "author": "Karl Marx",
+        "year": None,
+        "description": None,
+        "pages": [(url, [(url, "Preface", [], passages)])],
+    }
+
+
+def stored_texts(session, title: str) -> list[str]:
+    return [
+        text
+        for (text,) in session.query(models.Passage.text)
+        .join(models.Work)
+        .filter(models.Work.title == title)
+    ]
+
+
+def no_reload(cls, *args, **kwargs):
+    raise AssertionError("the index was loaded again")
+
+
+def test_load_reads_text_of_unsigned_passages_only(session, engine):
+    scrape_marxists.store_work(session, staged("First", PREFACE), confirm=False)
+    session.add(
+        models.Passage(
+            id="9.ch1.p1",
+            chapter=1,
+            paragraph=1,
+            text=OTHER,
+            translation="",
+            work_id=9,
+        )
+    )
+    session.commit()
+
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    index = DuplicateIndex.load(session)
+
+    assert len(index.signatures) == 2
+    assert "9.ch1.p1" in index.signatures
+    reads_text = [s for s in statements if "passages.text" in s]
+    assert reads_text and all("minhash IS NULL" in s for s in reads_text)
+
+
+def test_one_index_serves_every_work_of_a_run(session, monkeypatch):
+    index = DuplicateIndex.load(session)
+    monkeypatch.setattr(DuplicateIndex, "load", classmethod(no_reload))
+
+    scrape_marxists.store_work(
+        session, staged("First", PREFACE), confirm=False, index=index
+    )
+    scrape_marxists.store_work(
+        session, staged("Second", PREFACE, OTHER), confirm=False, index=index
+    )
+
+    assert stored_texts(session, "Second") == [OTHER]
+    assert len(index.report) == 1
+
+
+def test_aborted_works_leave_the_index(session, monkeypatch):
+    index = DuplicateIndex.load(session)
+    monkeypatch.setattr("builtins.input", lambda prompt: "n")
+    scrape_marxists.store_work(session, staged("First", PREFACE), index=index)
+    assert index.signatures == {}
+
+    scrape_marxists.store_work(
+        session, staged("Second", PREFACE), confirm=False, index=index
+    )
+    assert stored_texts(session, "Second") == [PREFACE]
+
+
+def test_discard_forgets_one_chapter_or_work():
+    index = DuplicateIndex()
+    sig = signature(PREFACE)
+    ids = ["1.ch1.p1", "1.ch1.p2", "1.ch12.p1", "2.ch3.p1"]
+    for passage_id in ids:
+        index.add(passage_id, sig)
+
+    assert set(index.discard("1.ch1.p")) == {"1.ch1.p1", "1.ch1.p2"}
+    assert set(index.signatures) == {"1.ch12.p1", "2.ch3.p1"}
+
+    index.begin()
+    assert set(index.discard("1.ch")) == {"1.ch12.p1"}
+    index.rollback()
+    assert set(index.discard("1.ch")) == {"1.ch12.p1"}
+    assert set(index.signatures) == {"2.ch3.p1"}
+    assert dict(index.groups) == {"2.ch": {"2.ch3.p1"}, "2.ch3.p": {"2.ch3.p1"}}
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scrape_marxists
+from fetcher import Fetcher, HTTPCache, OfflineCacheMiss
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "marxists")
+
+
+class MarxistsHandler(BaseHTTPRequestHandler):
+    """Serve the canned pages under /archive/marx/works/1847/wage-labour/."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooling is observable
+    prefix = "/archive/marx/works/1847/wage-labour/"
+
+    def do_GET(self):
+        server = self.server
+        name = ""
+        if self.path.startswith(self.prefix):
+            name = self.path[len(self.prefix) :]
+        with server.lock:
+            server.requests.append((name, self.client_address))
+            failures = server.failures.get(name, 0)
+            if failures:
+                server.failures[name] = failures - 1
+        time.sleep(server.delays.get(name, 0))
+
+        path = os.path.join(FIXTURES, name)
+        if failures:
+            self.reply(503, b"busy")
+        elif not name or not os.path.isfile(path):
+            self.reply(404, b"not found")
+        else:
+            with open(path, "rb") as f:
+                body = f.read()
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.reply(304, b"", {"ETag": etag})
+            else:
+                self.reply(200, body, {"ETag": etag, "Content-Type": "text/html"})
+
+    def reply(self, status, body, headers=None):
+        with self.server.lock:
+            self.server.statuses.append((self.path, status))
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), MarxistsHandler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.statuses = []
+    httpd.failures = {}
+    httpd.delays = {}
+    httpd.base = f"http://127.0.0.1:{httpd.server_port}{MarxistsHandler.prefix}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_fetcher(**kwargs) -> Fetcher:
+    kwargs.setdefault("rate", 0)
+    return Fetcher(**kwargs)
+
+
+def test_connections_are_pooled(server):
+    fetcher = make_fetcher(max_workers=1)
+    for name in ["index.htm", "ch01.htm", "ch02.htm", "ch03.htm"]:
+        assert "<html>" in fetcher.get(server.base + name)
+    fetcher.close()
+    clients = {client for _, client in server.requests}
+    assert len(server.requests) == 4
+    assert len(clients) == 1
+
+
+def test_get_many_yields_in_input_order(server):
+    server.delays = {"ch01.htm": 0.3}
+    urls = [server.base + name for name in ["ch01.htm", "ch02.htm", "ch03.htm"]]
+    fetcher = make_fetcher(max_workers=3)
+    results = list(fetcher.get_many(urls))
+    fetcher.close()
+
+    assert [url for url, _ in results] == urls
+    assert "Preliminary" in results[0][1]
+    assert "What are Wages?" in results[1][1]
+    # The slow page did not hold up the others' downloads.
+    assert server.statuses[-1][0].endswith("ch01.htm")
+
+
+def test_get_many_returns_errors_in_place(server):
+    urls = [server.base + "ch01.htm", server.base + "missing.htm"]
+    fetcher = make_fetcher(retries=0)
+    (_, body), (_, error) = fetcher.get_many(urls)
+    fetcher.close()
+    assert "Preliminary" in body
+    assert isinstance(error, Exception)
+
+
+def test_transient_errors_are_retried_with_backoff(server):
+    server.failures = {"ch02.htm": 2}
+    fetcher = make_fetcher(retries=3, backoff=0.1)
+    start = time.monotonic()
+    body = fetcher.get(server.base + "ch02.htm")
+    elapsed = time.monotonic() - start
+    fetcher.close()
+
+    assert "What are Wages?" in body
+    assert [s for _, s in server.statuses] == [503, 503, 200]
+    # urllib3 retries the first failure at once, then waits backoff * 2.
+    assert elapsed >= 0.2
+
+
+def test_retries_give_up(server):
+    server.failures = {"ch02.htm": 5}
+    fetcher = make_fetcher(retries=2, backoff=0)
+    with pytest.raises(Exception):
+        fetcher.get(server.base + "ch02.htm")
+    fetcher.close()
+    assert len(server.requests) == 3
+
+
+def test_rate_limit_spaces_requests_to_a_host(server):
+    fetcher = make_fetcher(max_workers=4, rate=20)
+    start = time.monotonic()
+    list(fetcher.get_many([server.base + "ch01.htm"] * 5))
+    fetcher.close()
+    assert time.monotonic() - start >= 4 / 20
+
+
+def test_unchanged_pages_are_revalidated(server, tmp_path):
+    url = server.base + "ch03.htm"
+    fetcher = make_fetcher(cache=HTTPCache(str(tmp_path)))
+    first = fetcher.get(url)
+    # Fragments address the same cached page.
+    second = fetcher.get(url + "#note")
+    fetcher.close()
+
+    assert first == second
+    assert [s for _, s in server.statuses] == [200, 304]
+
+
+def test_offline_mode_replays_the_cache(server, tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    online = make_fetcher(cache=cache)
+    body = online.get(server.base + "ch01.htm")
+    online.close()
+
+    offline = make_fetcher(cache=cache, offline=True)
+    assert offline.get(server.base + "ch01.htm") == body
+    with pytest.raises(OfflineCacheMiss):
+        offline.get(server.base + "ch02.htm")
+    offline.close()
+    assert len(server.requests) == 1
+
+
+def test_stage_work_parses_pages_in_link_order(server, monkeypatch, tmp_path):
+    server.delays = {"ch01.htm": 0.3}
+    monkeypatch.setattr(
+        scrape_marxists,
+        "fetcher",
+        make_fetcher(max_workers=3, cache=HTTPCache(str(tmp_path))),
+    )
+    staged = scrape_marxists.stage_work(
+        server.base + "index.htm", "Wage Labour and Capital", "Karl Marx"
+    )
+    scrape_marxists.fetcher.close()
+
+    assert staged["year"] == "1847"
+    assert [url for url, _ in staged["pages"]] == [
+        server.base + "ch01.htm",
+        server.base + "ch02.htm",
+        server.base + "ch03.htm",
+    ]
+    chapters = [chapter for _, page in staged["pages"] for chapter in page]
+    # ch03.htm is listed whole, so its #note link adds no chapter.
+    assert [title for _, title, _, _ in chapters] == [
+        "Preliminary",
+        "What are Wages?",
+        "By What is the Price of a Commodity Determined?",
+    ]
+    _, _, sections, passages = chapters[1]
+    assert sections == ["How are they Determined?"]
+    assert [section for section, _ in passages] == [None, 1, 1]
+    # Each page was downloaded once, the index included.
+    assert sorted(name for name, _ in server.requests) == [
+        "ch01.htm",
+        "ch02.htm",
+        "ch03.htm",
+        "index.htm",
+    ]
@@ -0,0 +1,54 @@
+import glob
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from html_parse import parse_html, text_of
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "marxists")
+
+REFERENCES = [
+    "&#151;",
+    "&#151",
+    "&#x97;",
+    "&#X96;",
+    "&#0151;",
+    "&#x0097;",
+    "&#128;",
+    "&#129;",
+    "&#159;",
+    "&#160;",
+    "&#1488;",
+    "&#1234;",
+    "&#15100;",
+    "&#x5d0;",
+    "&#x97a;",
+    "&#x8000;",
+    "&#8212;",
+    "&amp;#151;",
+]
+
+
+def soup_paragraphs(html: str) -> list[str]:
+    soup = BeautifulSoup(html, "html.parser")
+    return [p.get_text(" ", strip=True) for p in soup.find_all("p")]
+
+
+def lxml_paragraphs(html: str) -> list[str]:
+    return [text_of(p, " ") for p in parse_html(html).iter("p")]
+
+
+@pytest.mark.parametrize("ref", REFERENCES)
+def test_numeric_references_match_beautifulsoup(ref):
+    html = f"<html><body><p>labour{ref}power {ref}x</p></body></html>"
+    assert lxml_paragraphs(html) == soup_paragraphs(html)
+
+
+@pytest.mark.parametrize(
+    "path", sorted(glob.glob(os.path.join(FIXTURES, "*.htm"))), ids=os.path.basename
+)
+def test_fixture_pages_match_beautifulsoup(path):
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    assert lxml_paragraphs(html) == soup_paragraphs(html)
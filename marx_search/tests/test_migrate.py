@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import migrate
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Capital, Volume I as stored before works existed (schema version 0).
+OLD_SCHEMA = """
+CREATE TABLE chapters (
+    id INTEGER PRIMARY KEY, chapter_number INTEGER NOT NULL, title VARCHAR NOT NULL
+);
+CREATE TABLE sections (
+    id VARCHAR PRIMARY KEY, chapter INTEGER NOT NULL, section INTEGER NOT NULL,
+    title VARCHAR NOT NULL
+);
+CREATE TABLE passages (
+    id VARCHAR PRIMARY KEY, chapter INTEGER, section INTEGER, paragraph INTEGER,
+    text TEXT, translation VARCHAR
+);
+CREATE TABLE terms (
+    id VARCHAR PRIMARY KEY, term VARCHAR, definition TEXT, tags VARCHAR,
+    aliases TEXT
+);
+CREATE TABLE term_passage_link (
+    term_id VARCHAR, passage_id VARCHAR, text_snippet TEXT,
+    PRIMARY KEY (term_id, passage_id)
+);
+INSERT INTO chapters VALUES (1, 1, 'Commodities');
+INSERT INTO passages VALUES ('v1.ch1.p1', 1, NULL, 1, 'The wealth of those societies', '');
+"""
+
+MIGRATE = (
+    "import sys; from database import create_sqlite_engine; "
+    "from migrate import migrate; migrate(create_sqlite_engine(sys.argv[1]))"
+)
+
+
+def migrate_concurrently(path: str, processes: int = 4) -> None:
+    """Run `migrate` on `path` from several processes started together."""
+    env = dict(os.environ, MARX_DB_PATH=path)
+    children = [
+        subprocess.Popen(
+            [sys.executable, "-c", MIGRATE, path],
+            cwd=PACKAGE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(processes)
+    ]
+    errors = [child.communicate()[1] for child in children]
+    assert [child.returncode for child in children] == [0] * processes, errors
+
+
+def schema_version(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        (value,) = conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (migrate.SCHEMA_VERSION_KEY,)
+        ).fetchone()
+    return int(value)
+
+
+@pytest.mark.parametrize("old", [False, True], ids=["fresh", "version-0"])
+def test_workers_starting_together_migrate_once(tmp_path, old):
+    path = str(tmp_path / "marx_texts.db")
+    if old:
+        with sqlite3.connect(path) as conn:
+            conn.executescript(OLD_SCHEMA)
+
+    migrate_concurrently(path)
+
+    assert schema_version(path) == migrate.SCHEMA_VERSION
+    with sqlite3.connect(path) as conn:
+        works = conn.execute("SELECT title FROM works").fetchall()
+        passages = conn.execute("SELECT work_id FROM passages").fetchall()
+    if old:
+        assert works == [("Capital, Volume I",)]
+        assert passages == [(1,)]
+    else:
+        assert works == []
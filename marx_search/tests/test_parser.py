@@ -0,0 +1,89 @@
+import zipfile
+from xml.sax.saxutils import escape
+
+import models
+from dedup import DuplicateIndex
+from parser import DocxImport, iter_paragraphs
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+PREFACE = (
+    "The work, the first volume of which I now submit to the public, forms "
+    "the continuation of my Zur Kritik der Politischen Oekonomie."
+)
+
+
+def write_docx(path, paragraphs) -> str:
+    body = "".join(
+        f"<w:p><w:r><w:t>{escape(text)}</w:t></w:r></w:p>" for text in paragraphs
+    )
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr(
+            "word/document.xml",
+            f'<w:document xmlns:w="{W_NS}"><w:body>{body}</w:body></w:document>',
+        )
+    return str(path)
+
+
+def import_docx(session, work, path, dedup=None) -> DocxImport:
+    importer = DocxImport(session, work, {}, dedup)
+    importer.run(iter_paragraphs(path))
+    session.commit()
+    return importer
+
+
+def add_work(session, work_id: int) -> models.Work:
+    work = models.Work(id=work_id, title=f"Work {work_id}")
+    session.add(work)
+    session.commit()
+    return work
+
+
+def stored_texts(session, work_id: int) -> list[str]:
+    return [
+        text
+        for (text,) in session.query(models.Passage.text)
+        .filter(models.Passage.work_id == work_id)
+        .order_by(models.Passage.paragraph)
+    ]
+
+
+def test_reimport_deletes_passages_the_document_lost(session, tmp_path):
+    work = add_work(session, 1)
+    first = ["CHAPTER I", "First paragraph.", "Second paragraph.", "Third one."]
+    import_docx(session, work, write_docx(tmp_path / "a.docx", first))
+    passage_id = (
+        session.query(models.Passage.id).filter_by(text="Third one.").scalar()
+    )
+    session.add(models.Term(id="t", term="one", definition="", work_id=1))
+    session.add(
+        models.TermPassageLink(
+            term_id="t", passage_id=passage_id, text_snippet="one", work_id=1
+        )
+    )
+    session.commit()
+
+    shorter = ["CHAPTER I", "First paragraph.", "Second paragraph, revised."]
+    importer = import_docx(session, work, write_docx(tmp_path / "b.docx", shorter))
+
+    assert stored_texts(session, 1) == [
+        "First paragraph.",
+        "Second paragraph, revised.",
+    ]
+    assert importer.counts["updated"] == 1
+    assert importer.counts["deleted"] == 1
+    assert session.query(models.TermPassageLink).count() == 0
+
+
+def test_notes_after_a_skipped_duplicate_are_dropped(session, tmp_path):
+    original = write_docx(tmp_path / "a.docx", [PREFACE])
+    import_docx(session, add_work(session, 1), original)
+
+    work = add_work(session, 2)
+    paragraphs = ["CHAPTER I", "A paragraph of its own.", PREFACE, "1 A note."]
+    reprint = write_docx(tmp_path / "b.docx", paragraphs)
+    importer = import_docx(session, work, reprint, DuplicateIndex.load(session))
+
+    assert stored_texts(session, 2) == ["A paragraph of its own."]
+    assert importer.counts["footnotes"] == 0
+    assert session.query(models.Footnote).count() == 0
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# `publish` reads its paths from MARX_DB_PATH on import, so each scenario
+# runs in a process of its own.
+SCENARIO = """
+import json, os, sys
+from database import create_sqlite_engine
+from migrate import migrate
+import publish
+
+engine = create_sqlite_engine()
+migrate(engine)
+engine.dispose()
+
+generations = []
+for _ in range(3):
+    generations.append(publish.stage())
+    publish.publish(generations[-1])
+before = [os.path.exists(g) for g in generations]
+
+in_progress = publish.stage()
+publish.prune(keep={generations[-1], generations[-2]}, grace=0)
+after = [os.path.exists(g) for g in generations]
+json.dump(
+    {"before": before, "after": after, "in_progress": os.path.exists(in_progress)},
+    sys.stdout,
+)
+"""
+
+
+def test_replaced_generations_outlive_the_grace_period(tmp_path):
+    env = dict(os.environ, MARX_DB_PATH=str(tmp_path / "marx_texts.db"))
+    out = subprocess.run(
+        [sys.executable, "-c", SCENARIO],
+        cwd=PACKAGE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+
+    # Publishing keeps every generation retired within RETIRE_GRACE.
+    assert result["before"] == [True, True, True]
+    # Past it, only the live one and the one before it are kept...
+    assert result["after"] == [False, True, True]
+    # ...and copies that were never published are left alone.
+    assert result["in_progress"] is True
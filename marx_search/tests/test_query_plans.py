@@ -0,0 +1,15 @@
+import database
+from check_query_plans import check
+from database import create_sqlite_engine
+
+
+def test_endpoints_never_scan_a_filtered_or_joined_table(api):
+    main, client = api
+    engine = create_sqlite_engine(database.DB_PATH, read_only=True)
+    try:
+        failures = check(database.DB_PATH, engine, 1, 1, "value-1")
+    finally:
+        engine.dispose()
+    assert failures == []
+    # The API reads through its own engines again afterwards.
+    assert client.get("/works").status_code == 200
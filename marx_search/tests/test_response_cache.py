@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from response_cache import DiskCache, Entry, ResponseCache
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each worker imports, then sleeps until the common start time in argv[3].
+OPEN_CACHE = (
+    "import sys, time; from response_cache import DiskCache, Entry; "
+    "time.sleep(max(0, float(sys.argv[3]) - time.time())); "
+    "cache = DiskCache(sys.argv[1]); cache.set(sys.argv[2], Entry(b'{}'))"
+)
+
+
+def test_workers_starting_together_share_the_disk_cache(tmp_path):
+    path = str(tmp_path / "responses.db")
+    start = str(time.time() + 1)
+    children = [
+        subprocess.Popen(
+            [sys.executable, "-c", OPEN_CACHE, path, f"key-{n}", start],
+            cwd=PACKAGE_DIR,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for n in range(8)
+    ]
+    errors = [child.communicate()[1] for child in children]
+    assert [child.returncode for child in children] == [0] * 8, errors
+    assert DiskCache(path).get("key-0") == Entry(b"{}")
+
+
+def test_unusable_disk_cache_falls_back_to_memory(tmp_path, monkeypatch):
+    path = str(tmp_path / "responses.db")
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN EXCLUSIVE")
+    monkeypatch.setattr(DiskCache, "SETUP_TIMEOUT", 0.1)
+    try:
+        cache = ResponseCache(disk_path=path)
+    finally:
+        holder.close()
+
+    assert cache.disk is None
+    cache.set("1:/works/", Entry(b"[]"))
+    assert cache.get("1:/works/") == Entry(b"[]")
+
+
+def test_busy_disk_cache_skips_writes(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(disk_path=path)
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN EXCLUSIVE")
+    try:
+        cache.set("1:/works/", Entry(b"[]"))
+        cache.memory.clear()
+        assert cache.get("1:/works/") is None
+    finally:
+        holder.close()
+    # The write gave up after TIMEOUT_MS; WAL readers were never blocked.
+    assert cache.disk.errors == 1
+    assert cache.disk.misses == 1
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+import models
+import search_index
+from bench_search import FUZZY_QUERIES, build_corpus
+
+EXTRA_TEXTS = [
+    "It is necessary to distinguish the two forms of circulation.",
+    "Necessary labour-time and surplus labour-time.",
+    "value",
+    "surplus",
+]
+
+
+def misspell(rng: random.Random, word: str) -> str:
+    """Apply one random transposition, insertion, deletion or substitution."""
+    i = rng.randrange(len(word) - 1)
+    kind = rng.choice("tids")
+    if kind == "t":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+    if kind == "i":
+        return word[:i] + rng.choice("aeiou") + word[i:]
+    if kind == "d":
+        return word[:i] + word[i + 1 :]
+    return word[:i] + rng.choice("aeiou") + word[i + 1 :]
+
+
+@pytest.fixture
+def corpus(session):
+    build_corpus(session, works=2, passages_per_work=150)
+    for n, text in enumerate(EXTRA_TEXTS, start=1):
+        session.add(
+            models.Passage(
+                id=f"3.ch1.p{n}",
+                chapter=1,
+                paragraph=n,
+                text=text,
+                translation="",
+                work_id=3,
+            )
+        )
+    session.commit()
+    search_index.invalidate()
+    yield session
+    search_index.invalidate()
+
+
+def probe_queries(index: search_index.TrigramIndex) -> list[str]:
+    """Misspelt windows of the corpus, at and around word boundaries."""
+    rng = random.Random(0)
+    queries = list(FUZZY_QUERIES) + ["necesasry", "neccessary", "valeu", "surplsu"]
+    for _ in range(300):
+        text = rng.choice(index.texts)
+        length = rng.randint(4, 30)
+        start = rng.randint(-3, max(0, len(text) - length + 3))
+        window = text[max(0, start) : start + length]
+        if len(window) >= 3:
+            queries.append(misspell(rng, window))
+    return queries
+
+
+@pytest.mark.parametrize("threshold", [80, 90, 95])
+def test_candidates_keep_every_match(corpus, threshold):
+    index = search_index.get_trigram_index(corpus)
+    for q in probe_queries(index):
+        candidates = set(index.candidates(q, threshold=threshold))
+        for doc, text in enumerate(index.texts):
+            if fuzz.partial_ratio(q, text) > threshold:
+                assert doc in candidates, (q, text)
+
+
+def test_production_threshold_never_builds_postings(corpus):
+    index = search_index.get_trigram_index(corpus)
+    # No query is long enough for the bound to rule a passage out...
+    for length in range(1, 1000):
+        lost = search_index.max_lost_trigrams(length, search_index.FUZZY_THRESHOLD)
+        assert lost >= length - 2
+    # ...so fuzzy searches score every passage and never index trigrams.
+    for q in probe_queries(index):
+        search_index.rank_fuzzy(corpus, q)
+        assert index.candidates(q) == list(range(len(index)))
+    assert index.postings is None
+
+
+def test_candidates_prune_at_strict_thresholds(corpus):
+    index = search_index.get_trigram_index(corpus)
+    kept = index.candidates("circulation of commodities", threshold=95)
+    assert len(kept) < len(index)
+    assert index.postings is not None
+
+
+def test_rank_fuzzy_matches_full_scan(corpus):
+    index = search_index.get_trigram_index(corpus)
+    for q in probe_queries(index)[:60]:
+        ranked, total = search_index.rank_fuzzy(corpus, q)
+        expected = search_index.scan_fuzzy(corpus, q)
+        assert sorted(ranked) == sorted(expected)
+        assert total == len(expected)
+
+
+def test_rank_fuzzy_finds_transpositions(corpus):
+    ranked, _ = search_index.rank_fuzzy(corpus, "necesasry")
+    assert {"3.ch1.p1", "3.ch1.p2"} <= set(ranked)
+
+
+def test_ensure_version_drops_indexes_built_for_another_version(corpus):
+    index = search_index.get_index(corpus)
+    trigram_index = search_index.get_trigram_index(corpus)
+    search_index.install(index, trigram_index, 7)
+    search_index.ensure_version(7)
+    assert search_index.get_index(corpus) is index
+    search_index.ensure_version(8)
+    assert search_index.get_index(corpus) is not index
+    assert search_index.get_trigram_index(corpus) is not trigram_index
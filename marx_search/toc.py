@@ -0,0 +1,138 @@
+"""Precomputed tables of contents.
+
+A work's table of contents only changes when it is imported or its parts
+are seeded, so the tools that do either rebuild it (`rebuild`) in the same
+transaction, right after `corpus.bump_version`.  It is stored in the `tocs`
+table already serialized, once per endpoint shape, and the API sends it as
+is with the version it was built at as an ETag.
+
+Each chapter's part is found by bisecting the work's parts sorted by their
+first chapter id.
+
+Run ``python toc.py`` to rebuild every work's table of contents.
+"""
+
+import json
+from bisect import bisect_right
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import Chapter, Part, Section, TableOfContents, Work
+
+
+class PartLookup:
+    """Find the part containing a chapter id among one work's parts."""
+
+    def __init__(self, parts):
+        self.parts = sorted(parts, key=lambda p: p.start_chapter)
+        self.starts = [p.start_chapter for p in self.parts]
+
+    def find(self, chapter_id: int):
+        i = bisect_right(self.starts, chapter_id) - 1
+        if i >= 0 and chapter_id <= self.parts[i].end_chapter:
+            return self.parts[i]
+        return None
+
+
+def build(session: Session, work_id: int) -> tuple[list[dict], list[dict]]:
+    """Return the ``/chapters_with_sections`` and
+    ``/parts_with_chapters_sections`` payloads of one work."""
+    chapters = session.execute(
+        select(Chapter.id, Chapter.chapter_number, Chapter.title)
+        .where(Chapter.work_id == work_id)
+        .order_by(Chapter.id)
+    ).all()
+    sections = session.execute(
+        select(Section.chapter, Section.section, Section.title)
+        .where(Section.work_id == work_id)
+        .order_by(Section.chapter, Section.section)
+    ).all()
+    parts = session.execute(
+        select(Part.number, Part.title, Part.start_chapter, Part.end_chapter)
+        .where(Part.work_id == work_id)
+        .order_by(Part.number)
+    ).all()
+
+    section_map: dict[int, list[dict]] = {}
+    for sec in sections:
+        section_map.setdefault(sec.chapter, []).append(
+            {"section": sec.section, "title": sec.title}
+        )
+
+    lookup = PartLookup(parts)
+    by_part: dict[tuple, list[dict]] = {}
+    toc = []
+    for ch in chapters:
+        entry = {
+            "id": ch.id,
+            "chapter_number": ch.chapter_number,
+            "title": ch.title,
+            "sections": section_map.get(ch.id, []),
+        }
+        part = lookup.find(ch.id)
+        toc.append(
+            {
+                **entry,
+                "part": (
+                    {"number": part.number, "title": part.title} if part else None
+                ),
+            }
+        )
+        if part is not None:
+            by_part.setdefault((part.number, part.start_chapter), []).append(entry)
+
+    grouped = [
+        {
+            "number": part.number,
+            "title": part.title,
+            "chapters": sorted(
+                by_part[part.number, part.start_chapter],
+                key=lambda ch: ch["chapter_number"],
+            ),
+        }
+        for part in parts
+        if (part.number, part.start_chapter) in by_part
+    ]
+    return toc, grouped
+
+
+def _dumps(payload) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def rebuild(session: Session, work_id: int, version: int) -> None:
+    """Store the table of contents of `work_id`; the caller commits."""
+    chapters, parts = build(session, work_id)
+    values = {
+        "work_id": work_id,
+        "version": version,
+        "chapters": _dumps(chapters),
+        "parts": _dumps(parts),
+    }
+    session.execute(
+        insert(TableOfContents)
+        .values(**values)
+        .on_conflict_do_update(index_elements=["work_id"], set_=values)
+    )
+
+
+def rebuild_all(session: Session, version: int) -> int:
+    """Rebuild every work's table of contents; return how many."""
+    work_ids = session.execute(select(Work.id)).scalars().all()
+    for work_id in work_ids:
+        rebuild(session, work_id, version)
+    return len(work_ids)
+
+
+if __name__ == "__main__":
+    from corpus import bump_version
+    from database import WriterSession, writer_engine
+    from migrate import migrate
+
+    migrate(writer_engine)
+    with WriterSession() as session:
+        count = rebuild_all(session, bump_version(session))
+        session.commit()
+    print(f"✅ Rebuilt the table of contents of {count} works")
@@ -1,49 +1,161 @@
-import re
+import argparse
+
+from sqlalchemy import delete, insert, tuple_, update
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
+from corpus import bump_version
+from database import WriterSession
+from fts import phrase_candidates
 from models import Term, Passage, TermPassageLink
-from scrape_marxists import extract_context_snippet
+from term_linker import TermLinker, snippet_at, term_surfaces
+
+# Works whose links are (re)generated automatically.
+LINKED_WORK_IDS = (6, 7, 8, 9, 10)
 
 
 def update_links_for_work(session: Session, work_id: int) -> int:
     """Scan passages for all terms and create TermPassageLink rows."""
-    terms = session.query(Term).all()
-    passages = session.query(Passage).filter(Passage.work_id == work_id).all()
-    added = 0
-
-    for passage in passages:
-        text = passage.text or ""
-        for term in terms:
-            if not term.term:
-                continue
-            if not re.search(rf"\b{re.escape(term.term)}\b", text, re.IGNORECASE):
+    linker = TermLinker(session.query(Term).all())
+    existing = set(
+        session.query(TermPassageLink.term_id, TermPassageLink.passage_id)
+        .join(Passage, Passage.id == TermPassageLink.passage_id)
+        .filter(Passage.work_id == work_id)
+    )
+    passages = session.query(Passage.id, Passage.text).filter(
+        Passage.work_id == work_id
+    )
+
+    new_links = []
+    for passage_id, text in passages:
+        for term_id, (start, end) in linker.find(text or "").items():
+            if (term_id, passage_id) in existing:
                 continue
-            exists = (
-                session.query(TermPassageLink)
-                .filter_by(term_id=term.id, passage_id=passage.id)
-                .first()
+            existing.add((term_id, passage_id))
+            new_links.append(
+                {
+                    "term_id": term_id,
+                    "passage_id": passage_id,
+                    "text_snippet": snippet_at(text, start, end),
+                    "match_start": start,
+                    "match_end": end,
+                    "work_id": work_id,
+                }
             )
-            if exists:
-                continue
-            snippet = extract_context_snippet(text, term.term)
-            link = TermPassageLink(
-                term_id=term.id,
-                passage_id=passage.id,
-                text_snippet=snippet,
-                work_id=work_id,
+
+    if new_links:
+        session.execute(insert(TermPassageLink), new_links)
+        bump_version(session)
+    session.commit()
+    return len(new_links)
+
+
+def relink_terms(
+    session: Session,
+    term_ids: list[str],
+    work_ids: tuple[int, ...] = LINKED_WORK_IDS,
+) -> tuple[int, int]:
+    """Bring the links of `term_ids` up to date after they were added or edited.
+
+    Only passages that can mention one of the terms are read (looked up
+    through the FTS index when available), and only the affected
+    TermPassageLink rows are inserted, updated or deleted.  Ids of deleted
+    terms lose all their links in `work_ids`.  Returns ``(added, removed)``.
+    """
+    terms = session.query(Term).filter(Term.id.in_(term_ids)).all()
+    linker = TermLinker(terms)
+
+    surfaces = sorted({s for t in terms for s in term_surfaces(t)})
+    candidates = phrase_candidates(session, surfaces) if surfaces else []
+    if candidates is None:
+        candidates = session.query(Passage.id, Passage.work_id, Passage.text)
+
+    wanted = {}
+    for passage_id, work_id, text in candidates:
+        if work_id not in work_ids:
+            continue
+        for term_id, (start, end) in linker.find(text or "").items():
+            wanted[(term_id, passage_id)] = {
+                "term_id": term_id,
+                "passage_id": passage_id,
+                "text_snippet": snippet_at(text, start, end),
+                "match_start": start,
+                "match_end": end,
+                "work_id": work_id,
+            }
+
+    current = {
+        (row.term_id, row.passage_id): (
+            row.text_snippet,
+            row.match_start,
+            row.match_end,
+        )
+        for row in session.query(
+            TermPassageLink.term_id,
+            TermPassageLink.passage_id,
+            TermPassageLink.text_snippet,
+            TermPassageLink.match_start,
+            TermPassageLink.match_end,
+        ).filter(
+            TermPassageLink.term_id.in_(term_ids),
+            TermPassageLink.work_id.in_(work_ids),
+        )
+    }
+
+    stale = [key for key in current if key not in wanted]
+    new = [row for key, row in wanted.items() if key not in current]
+    changed = [
+        row
+        for key, row in wanted.items()
+        if key in current
+        and current[key]
+        != (row["text_snippet"], row["match_start"], row["match_end"])
+    ]
+
+    for start in range(0, len(stale), 500):
+        session.execute(
+            delete(TermPassageLink).where(
+                tuple_(TermPassageLink.term_id, TermPassageLink.passage_id).in_(
+                    stale[start : start + 500]
+                )
             )
-            session.add(link)
-            added += 1
+        )
+    if new:
+        session.execute(insert(TermPassageLink), new)
+    if changed:
+        session.execute(
+            update(TermPassageLink),
+            [
+                {key: value for key, value in row.items() if key != "work_id"}
+                for row in changed
+            ],
+        )
+    if stale or new or changed:
+        bump_version(session)
     session.commit()
-    return added
+    return len(new), len(stale)
 
 
 def main() -> None:
-    session = SessionLocal()
+    parser = argparse.ArgumentParser(
+        description="Link glossary terms to the passages that mention them."
+    )
+    parser.add_argument(
+        "--terms",
+        nargs="+",
+        metavar="TERM_ID",
+        help="only relink these (new, edited or deleted) terms",
+    )
+    args = parser.parse_args()
+
+    session = WriterSession()
     try:
+        if args.terms:
+            added, removed = relink_terms(session, args.terms)
+            print(f"Added {added} and removed {removed} links")
+            return
+
         total_added = 0
-        for work_id in (6, 7, 8, 9, 10):
+        for work_id in LINKED_WORK_IDS:
             added = update_links_for_work(session, work_id)
             print(f"Work {work_id}: added {added} links")
             total_added += added